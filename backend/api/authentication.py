@@ -0,0 +1,133 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import bump_version, get_versions, version_key
+
+User = get_user_model()
+
+
+def token_digest(key):
+    """Сам токен в ключи общего кэша не попадает."""
+    return sha256(key.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    Снимки пользователей по токену в памяти процесса.
+    Хранит не больше TOKEN_CACHE_SIZE записей, вытесняя давно не
+    использованные, каждая живет TOKEN_CACHE_TTL секунд.
+    Снимок действителен, пока в общем кэше не сменились версии токена
+    и пользователя, с которыми он был загружен: их сверяют при каждом
+    запросе, так что выход и блокировка видны во всех процессах сразу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+
+    @staticmethod
+    def version_keys(key, user_id):
+        return (version_key(Token, token_digest(key)),
+                version_key(User, user_id))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, snapshot, versions = entry
+            if expires <= time.monotonic():
+                self._discard(key)
+                return None
+        keys = self.version_keys(key, snapshot[0].pk)
+        current = cache.get_many(keys)
+        if tuple(current.get(name) for name in keys) != versions:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._discard(key)
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return snapshot
+
+    def load(self, key, loader):
+        """
+        Загружает снимок из базы. Версию токена читаем до загрузки:
+        если токен удалят в это время, снимок сразу окажется устаревшим.
+        """
+        digest = token_digest(key)
+        token_version = get_versions(Token, [digest])[digest]
+        snapshot = loader(key)
+        user_id = snapshot[0].pk
+        user_version = get_versions(User, [user_id])[user_id]
+        self._remember(key, snapshot, (token_version, user_version))
+        return snapshot
+
+    def invalidate(self, key):
+        with self._lock:
+            self._discard(key)
+        bump_version(Token, token_digest(key))
+
+    def invalidate_user(self, user_id):
+        """Версию пользователя меняет сигнал bump_user_version."""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def _remember(self, key, snapshot, versions):
+        user_id = snapshot[0].pk
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_TTL, snapshot,
+                versions
+            )
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[1][0].pk
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Проверка токена без запроса к базе, пока снимок пользователя в кэше.
+    Вместо базы каждый запрос сверяет версии токена и пользователя
+    в общем кэше одним обращением.
+    Каждый запрос получает свою копию пользователя и токена.
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = token_cache.get(key)
+        if snapshot is None:
+            snapshot = token_cache.load(
+                key, super().authenticate_credentials
+            )
+        user, token = snapshot
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
@@ -0,0 +1,222 @@
+import base64
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from app.models import (Favorite, Ingredient, IngredientsAmount, Recipe,
+                        ShoppingCart, ShoppingListItem, Tag, TimelineEntry,
+                        TrendingScore)
+from users.models import Follow
+
+User = get_user_model()
+
+SEED = 2023
+PASSWORD = 'benchmark-password'
+USERS = 30
+INGREDIENTS = 500
+RECIPES = 120
+INGREDIENTS_PER_RECIPE = 8
+FOLLOWS = 15
+FAVORITES = 40
+CARTS = 12
+
+# Сценарии: имя, метод, адрес, данные, клиент, ожидаемый статус.
+# Клиент: None - аноним, 'user' - основной пользователь,
+# 'token' - клиент с токеном, полученным при входе.
+# Запросы на чтение повторяются, запись выполняется один раз по порядку.
+SCENARIOS = (
+    ('tags:list', 'get', '/api/tags/', None, None, 200),
+    ('tags:detail', 'get', '/api/tags/{tag}/', None, None, 200),
+    ('ingredients:list', 'get', '/api/ingredients/', None, None, 200),
+    ('ingredients:search', 'get', '/api/ingredients/?name=ингр', None,
+     None, 200),
+    ('ingredients:fuzzy', 'get', '/api/ingredients/?name=ингр&fuzzy=1',
+     None, None, 200),
+    ('ingredients:detail', 'get', '/api/ingredients/{ingredient}/', None,
+     None, 200),
+    ('recipes:list:anon', 'get', '/api/recipes/', None, None, 200),
+    ('recipes:list', 'get', '/api/recipes/', None, 'user', 200),
+    ('recipes:list:limit', 'get', '/api/recipes/?limit=24', None, 'user',
+     200),
+    ('recipes:list:cursor', 'get', '/api/recipes/?pagination=cursor', None,
+     'user', 200),
+    ('recipes:list:popular', 'get', '/api/recipes/?ordering=popular', None,
+     'user', 200),
+    ('recipes:list:popular:cursor', 'get',
+     '/api/recipes/?ordering=popular&pagination=cursor', None, 'user', 200),
+    ('recipes:feed', 'get', '/api/recipes/feed/', None, 'user', 200),
+    ('recipes:trending', 'get', '/api/recipes/trending/', None, 'user',
+     200),
+    ('recipes:trending:tags', 'get', '/api/recipes/trending/?tags=lunch',
+     None, 'user', 200),
+    ('recipes:by-ingredients', 'get',
+     '/api/recipes/by-ingredients/?{pantry}', None, 'user', 200),
+    ('recipes:list:tags', 'get', '/api/recipes/?tags=lunch&tags=dinner',
+     None, 'user', 200),
+    ('recipes:list:author', 'get', '/api/recipes/?author={author}', None,
+     'user', 200),
+    ('recipes:list:favorited', 'get', '/api/recipes/?is_favorited=1', None,
+     'user', 200),
+    ('recipes:list:cart', 'get', '/api/recipes/?is_in_shopping_cart=1',
+     None, 'user', 200),
+    ('recipes:detail:anon', 'get', '/api/recipes/{recipe}/', None, None,
+     200),
+    ('recipes:detail', 'get', '/api/recipes/{recipe}/', None, 'user', 200),
+    ('recipes:download:txt', 'get', '/api/recipes/download_shopping_cart/',
+     None, 'user', 200),
+    ('recipes:download:csv', 'get',
+     '/api/recipes/download_shopping_cart/?format=csv', None, 'user', 200),
+    ('recipes:download:pdf', 'get',
+     '/api/recipes/download_shopping_cart/?format=pdf', None, 'user', 200),
+    ('users:list', 'get', '/api/users/', None, None, 200),
+    ('users:detail', 'get', '/api/users/{author}/', None, 'user', 200),
+    ('users:me', 'get', '/api/users/me/', None, 'user', 200),
+    ('users:subscriptions', 'get', '/api/users/subscriptions/', None,
+     'user', 200),
+    ('users:subscriptions:limit', 'get',
+     '/api/users/subscriptions/?recipes_limit=3', None, 'user', 200),
+    ('recipes:create', 'post', '/api/recipes/',
+     lambda context: recipe_data(context, 'Новый рецепт'), 'user', 201),
+    ('recipes:update', 'patch', '/api/recipes/{new_recipe}/',
+     lambda context: recipe_data(context, 'Измененный рецепт'), 'user',
+     200),
+    ('recipes:favorite', 'post', '/api/recipes/{other_recipe}/favorite/',
+     None, 'user', 201),
+    ('recipes:unfavorite', 'delete',
+     '/api/recipes/{other_recipe}/favorite/', None, 'user', 204),
+    ('recipes:cart:add', 'post',
+     '/api/recipes/{other_recipe}/shopping_cart/', None, 'user', 201),
+    ('recipes:cart:remove', 'delete',
+     '/api/recipes/{other_recipe}/shopping_cart/', None, 'user', 204),
+    ('users:subscribe', 'post', '/api/users/{stranger}/subscribe/', None,
+     'user', 201),
+    ('users:unsubscribe', 'delete', '/api/users/{stranger}/subscribe/',
+     None, 'user', 204),
+    ('recipes:delete', 'delete', '/api/recipes/{new_recipe}/', None,
+     'user', 204),
+    ('users:create', 'post', '/api/users/',
+     lambda context: {'email': 'new@benchmark.ru', 'username': 'new',
+                      'first_name': 'Новый', 'last_name': 'Пользователь',
+                      'password': PASSWORD}, None, 201),
+    ('auth:login', 'post', '/api/auth/token/login/',
+     lambda context: {'email': context['email'], 'password': PASSWORD},
+     None, 200),
+    ('auth:logout', 'post', '/api/auth/token/logout/', None, 'token', 204),
+)
+
+
+def png():
+    buffer = BytesIO()
+    Image.new('RGB', (640, 480), (200, 120, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def recipe_data(context, name):
+    return {
+        'name': name,
+        'text': 'Описание',
+        'cooking_time': 15,
+        'image': 'data:image/png;base64,' + context['image'],
+        'tags': context['tags'][:2],
+        'ingredients': [{'id': pk, 'amount': amount}
+                        for amount, pk in enumerate(context['ingredients'],
+                                                    start=1)],
+    }
+
+
+def build_fixtures():
+    """
+    Наполняет пустую базу одинаковыми при каждом запуске данными.
+    Возвращает основного пользователя и значения для адресов сценариев.
+    """
+    rng = random.Random(SEED)
+    password = make_password(PASSWORD)
+    users = User.objects.bulk_create(
+        User(email=f'user{i}@benchmark.ru', username=f'user{i}',
+             first_name='Имя', last_name='Фамилия', password=password)
+        for i in range(USERS)
+    )
+    tags = Tag.objects.bulk_create(
+        Tag(name=slug, slug=slug, color=color, bit=bit)
+        for bit, (slug, color) in enumerate((('breakfast', '#E26C2D'),
+                                             ('lunch', '#49B64E'),
+                                             ('dinner', '#8775D2')))
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'ингредиент {i:03}',
+                   measurement_unit=rng.choice(('г', 'мл', 'шт.')))
+        for i in range(INGREDIENTS)
+    )
+    image = Recipe.image.field.storage.save(
+        'recipe_images/benchmark.png', ContentFile(png())
+    )
+    user, authors = users[0], users[1:]
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author=rng.choice(authors), name=f'Рецепт {i}',
+               text='Описание', cooking_time=rng.randint(1, 120),
+               image=image)
+        for i in range(RECIPES)
+    )
+    IngredientsAmount.objects.bulk_create(
+        IngredientsAmount(recipe=recipe, ingredient=ingredient,
+                          amount=rng.randint(1, 500))
+        for recipe in recipes
+        for ingredient in rng.sample(ingredients, INGREDIENTS_PER_RECIPE)
+    )
+    recipe_tags = {recipe: rng.sample(tags, rng.randint(1, 2))
+                   for recipe in recipes}
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for recipe, chosen_tags in recipe_tags.items()
+        for tag in chosen_tags
+    )
+    for recipe, chosen_tags in recipe_tags.items():
+        recipe.tags_mask = Tag.mask(chosen_tags)
+    Recipe.objects.bulk_update(recipes, ('tags_mask',))
+    followed = rng.sample(authors, FOLLOWS)
+    Follow.objects.bulk_create(Follow(user=user, author=author)
+                               for author in followed)
+    chosen = rng.sample(recipes, FAVORITES + 1)
+    Favorite.objects.bulk_create(Favorite(user=user, recipe=recipe)
+                                 for recipe in chosen[:FAVORITES])
+    ShoppingCart.objects.bulk_create(ShoppingCart(user=user, recipe=recipe)
+                                     for recipe in chosen[:CARTS])
+    for recipe in chosen[:FAVORITES]:
+        recipe.favorites_count = 1
+        recipe.shopcarts_count = int(recipe in chosen[:CARTS])
+    Recipe.objects.bulk_update(chosen, ('favorites_count', 'shopcarts_count'))
+    for author in authors:
+        author.recipes_count = sum(recipe.author == author
+                                   for recipe in recipes)
+        author.followers_count = int(author in followed)
+    User.objects.bulk_update(authors, ('recipes_count', 'followers_count'))
+    TimelineEntry.objects.fan_out(recipes)
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=row['user'], ingredient_id=row['ingredient'],
+                         total_amount=row['total_amount'])
+        for row in ShoppingListItem.objects.totals()
+    )
+    TrendingScore.objects.refresh(timedelta(hours=72))
+    return user, {
+        'email': user.email,
+        'tag': tags[0].id,
+        'tags': [tag.id for tag in tags],
+        'ingredient': ingredients[0].id,
+        'ingredients': [ingredient.id for ingredient in ingredients[:4]],
+        'recipe': chosen[0].id,
+        'pantry': '&'.join(
+            f'ingredients={pk}' for pk in IngredientsAmount.objects.filter(
+                recipe=chosen[0]
+            ).values_list('ingredient', flat=True)[:5]
+        ),
+        'other_recipe': chosen[-1].id,
+        'author': followed[0].id,
+        'stranger': next(author.id for author in authors
+                         if author not in followed),
+        'image': base64.b64encode(png()).decode(),
+    }
@@ -0,0 +1,104 @@
+import secrets
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from app.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+FRAGMENT_FORMAT = 2
+FRAGMENT_STATS_KEYS = {
+    'hits': 'stats:recipe_fragments:hits',
+    'rebuilds': 'stats:recipe_fragments:rebuilds',
+}
+
+
+def version_key(model, pk=None):
+    key = f'version:{model._meta.label_lower}'
+    return key if pk is None else f'{key}:{pk}'
+
+
+def get_version(model):
+    """Версия данных модели, увеличивается при каждом изменении."""
+    return get_versions(model, [None])[None]
+
+
+def new_version():
+    """
+    Случайная метка версии. В отличие от счетчика, не повторяется,
+    если ключ версии вытеснен из кэша и заведен заново.
+    """
+    return secrets.token_hex(8)
+
+
+def get_versions(model, pks):
+    """Версии объектов модели; отсутствующие в кэше заводятся заново."""
+    keys = {pk: version_key(model, pk) for pk in pks}
+    versions = cache.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in versions]
+    if missing:
+        # add не затирает версию, которую успел выставить bump_version
+        # в другом процессе.
+        for key in missing:
+            cache.add(key, new_version(), settings.CACHE_VERSION_TIMEOUT)
+        versions.update(cache.get_many(missing))
+        for key in missing:
+            versions.setdefault(key, new_version())
+    return {pk: versions[key] for pk, key in keys.items()}
+
+
+def bump_version(model, pk=None):
+    cache.set(version_key(model, pk), new_version(),
+              settings.CACHE_VERSION_TIMEOUT)
+
+
+def increment(key, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, delta)
+
+
+def get_fragment_stats():
+    stats = cache.get_many(FRAGMENT_STATS_KEYS.values())
+    return {name: stats.get(key, 0)
+            for name, key in FRAGMENT_STATS_KEYS.items()}
+
+
+def get_recipe_fragments(recipes, build):
+    """
+    Не зависящие от пользователя представления рецептов.
+    Ключ фрагмента включает версии рецепта, его автора, тегов и
+    ингредиентов, поэтому любое их изменение дает новый ключ.
+    Недостающие фрагменты собираются одним вызовом build(ids).
+    """
+    recipe_versions = get_versions(Recipe, {recipe.id for recipe in recipes})
+    author_versions = get_versions(
+        User, {recipe.author_id for recipe in recipes}
+    )
+    common = f'{get_version(Tag)}:{get_version(Ingredient)}'
+    keys = {
+        recipe.id: ':'.join((
+            f'fragment:{FRAGMENT_FORMAT}:recipe:{recipe.id}',
+            str(recipe_versions[recipe.id]),
+            str(author_versions[recipe.author_id]),
+            common
+        ))
+        for recipe in recipes
+    }
+    fragments = cache.get_many(keys.values())
+    missing = [pk for pk, key in keys.items() if key not in fragments]
+    if missing:
+        built = {keys[pk]: fragment
+                 for pk, fragment in build(missing).items()}
+        cache.set_many(built, timeout=settings.RECIPE_FRAGMENT_TIMEOUT)
+        fragments.update(built)
+    increment(FRAGMENT_STATS_KEYS['hits'], len(keys) - len(missing))
+    increment(FRAGMENT_STATS_KEYS['rebuilds'], len(missing))
+    return {pk: fragments[key]
+            for pk, key in keys.items() if key in fragments}
@@ -1,42 +1,83 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
 from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Lower
 from django_filters.rest_framework import FilterSet, filters
 
-from app.models import Ingredient, Recipe, Tag
+from app.models import POPULAR_ORDERING, Ingredient, Recipe
 from users.models import CustomUser
 
+from .search import tag_bits, tag_choices
+
 
 class IngredientFilter(FilterSet):
-    """Фильтр ингредиентов по названию."""
+    """
+    Фильтр ингредиентов по названию.
+    Сравнение идет по lower(name): на PostgreSQL поиск по началу и по
+    вхождению обслуживают индексы, на других СУБД это обычный LIKE.
+    С fuzzy=true на PostgreSQL ищет похожие названия по триграммам.
+    """
     name = filters.CharFilter(method='filter_name')
+    fuzzy = filters.BooleanFilter(method='filter_fuzzy')
 
     class Meta:
         model = Ingredient
-        fields = ('name',)
+        fields = ('name', 'fuzzy')
 
     def filter_name(self, queryset, name, value):
-        return queryset.filter(
-            Q(name__istartswith=value) | Q(name__icontains=value)
-        ).annotate(
+        value = value.lower()
+        queryset = queryset.annotate(lower_name=Lower('name'))
+        if (self.form.cleaned_data.get('fuzzy')
+                and connections[queryset.db].vendor == 'postgresql'):
+            return queryset.filter(lower_name__trigram_similar=value).annotate(
+                similarity=TrigramSimilarity('lower_name', value)
+            ).order_by('-similarity', 'name')
+        return queryset.filter(lower_name__contains=value).annotate(
             startswith=ExpressionWrapper(
-                Q(name__istartswith=value), output_field=BooleanField()
+                Q(lower_name__startswith=value), output_field=BooleanField()
             )
-        ).order_by('-startswith')
+        ).order_by('-startswith', 'name')
+
+    def filter_fuzzy(self, queryset, name, value):
+        return queryset
 
 
 class RecipeFilter(FilterSet):
-    """Фильтр рецептов по автору/тегу/подписке/наличию в списке покупок."""
-    tags = filters.ModelMultipleChoiceFilter(queryset=Tag.objects.all(),
-                                             field_name='tags__slug',
-                                             to_field_name='slug')
+    """
+    Фильтр рецептов по автору/тегу/подписке/наличию в списке покупок.
+    Теги проверяются по маске рецепта без соединения с таблицей тегов:
+    по умолчанию подходит любой из тегов, с tags_match=all - все сразу.
+    """
+    tags = filters.MultipleChoiceFilter(choices=tag_choices,
+                                        method='filter_tags')
+    tags_match = filters.ChoiceFilter(choices=(('any', 'Любой из тегов'),
+                                               ('all', 'Все теги')),
+                                      method='filter_tags_match')
     author = filters.ModelChoiceFilter(queryset=CustomUser.objects.all(),)
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(choices=(('popular', 'Популярные'),),
+                                    method='filter_ordering')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'tags_match', 'is_favorited',
+                  'is_in_shopping_cart', 'ordering')
+
+    def filter_tags(self, queryset, name, value):
+        bits = tag_bits.get()
+        mask = 0
+        for slug in value:
+            if slug in bits:
+                mask |= 1 << bits[slug]
+        return queryset.with_tags(
+            mask, self.form.cleaned_data.get('tags_match') == 'all'
+        )
+
+    def filter_tags_match(self, queryset, name, value):
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -47,3 +88,6 @@ class RecipeFilter(FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopcarts__user=self.request.user)
         return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*POPULAR_ORDERING)
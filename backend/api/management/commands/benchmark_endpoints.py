@@ -0,0 +1,184 @@
+import gc
+import json
+import math
+import os
+import statistics
+import tempfile
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.test import APIClient
+
+from api.benchmarks import SCENARIOS, build_fixtures
+
+BUDGETS_FILE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), 'benchmark_budgets.json')
+MIN_TIME_BUDGET = 50
+TIME_BUDGET_FACTOR = 3
+
+
+class Command(BaseCommand):
+    """
+    Прогоняем запросы ко всем адресам API на одинаковых тестовых данных.
+    Для каждого сценария считаем SQL-запросы с пустым и прогретым кэшем
+    и время ответа, сравниваем с бюджетом из benchmark_budgets.json.
+    В файле хранятся измерения, записанные один раз: запросов должно быть
+    не больше записанного, время - не больше TIME_BUDGET_FACTOR записанных
+    и не меньше MIN_TIME_BUDGET мс.
+    Данные создаются во временной тестовой базе, рабочая не затрагивается.
+    Маршрутизация в реплику отключается: все запросы идут в тестовую базу.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budgets', default=BUDGETS_FILE, type=str)
+        parser.add_argument('--repeat', default=5, type=int,
+                            help='Сколько раз повторять запросы на чтение.')
+        parser.add_argument('--skip-time', action='store_true',
+                            help='Не проверять бюджет времени.')
+        parser.add_argument('--update', action='store_true',
+                            help='Дописать бюджет для новых сценариев.')
+        parser.add_argument('--reset', action='store_true',
+                            help='Перезаписать бюджет всех сценариев.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(
+                        MEDIA_ROOT=media_root,
+                        DATABASE_ROUTERS=[],
+                        CACHES={'default': {
+                            'BACKEND': 'django.core.cache.backends.locmem.'
+                                       'LocMemCache',
+                            'LOCATION': 'benchmark',
+                        }}):
+                results = self.run_scenarios(options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['update'] or options['reset']:
+            self.write_budgets(options['budgets'], results, options['reset'])
+            return
+        failures = self.check_budgets(options['budgets'], results,
+                                      options['skip_time'])
+        if failures:
+            raise CommandError('Превышен бюджет: ' + ', '.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Все сценарии в бюджете: {len(results)} ==='
+        ))
+
+    def run_scenarios(self, repeat):
+        user, context = build_fixtures()
+        clients = {None: APIClient(), 'user': APIClient(),
+                   'token': APIClient()}
+        clients['user'].force_authenticate(user)
+        results = {}
+        for name, method, url, data, client, status in SCENARIOS:
+            url = url.format(**context)
+            request = getattr(clients[client], method)
+            payload = data(context) if data else None
+            cache.clear()
+            queries, elapsed, response = self.measure(request, url, payload)
+            if response.status_code != status:
+                raise CommandError(
+                    f'{name}: {method.upper()} {url} вернул '
+                    f'{response.status_code} вместо {status}'
+                )
+            result = {'queries': queries}
+            if method == 'get':
+                cached_queries, _, _ = self.measure(request, url, payload)
+                result['cached_queries'] = cached_queries
+                elapsed = statistics.median(
+                    self.measure(request, url, payload)[1]
+                    for _ in range(repeat)
+                )
+            result['ms'] = round(elapsed, 1)
+            results[name] = result
+            if name == 'recipes:create':
+                context['new_recipe'] = response.data['id']
+            if name == 'auth:login':
+                clients['token'].credentials(
+                    HTTP_AUTHORIZATION=f'Token {response.data["auth_token"]}'
+                )
+        return results
+
+    @staticmethod
+    def measure(request, url, payload):
+        # Сборка мусора, начатая посреди запроса, добавляет к его времени
+        # десятки миллисекунд: перед замером она проводится заранее.
+        gc.collect()
+        with CaptureQueriesContext(connection) as context:
+            started = perf_counter()
+            response = request(url, payload, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (perf_counter() - started) * 1000
+        return len(context.captured_queries), elapsed, response
+
+    @staticmethod
+    def read_budgets(filename):
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f'Файл {filename} не найден, '
+                               'создайте его с флагом --update')
+
+    @staticmethod
+    def time_budget(budget):
+        return max(MIN_TIME_BUDGET,
+                   math.ceil(budget['ms'] * TIME_BUDGET_FACTOR))
+
+    @classmethod
+    def exceeded(cls, result, budget, skip_time=False):
+        """Показатели сценария, вышедшие за бюджет."""
+        exceeded = [key for key in ('queries', 'cached_queries')
+                    if key in result and result[key] > budget[key]]
+        if not skip_time and result['ms'] > cls.time_budget(budget):
+            exceeded.append('ms')
+        return exceeded
+
+    def check_budgets(self, filename, results, skip_time):
+        budgets = self.read_budgets(filename)
+        failures = []
+        for name, result in results.items():
+            budget = budgets.get(name)
+            if budget is None:
+                failures.append(f'{name} (нет бюджета)')
+                continue
+            line = (f'{name:<28} запросов {result["queries"]:>3}'
+                    f'/{budget["queries"]:<3}')
+            if 'cached_queries' in result:
+                line += (f' из кэша {result["cached_queries"]:>3}'
+                         f'/{budget["cached_queries"]:<3}')
+            line += f' {result["ms"]:>8.1f}/{self.time_budget(budget)} мс'
+            if self.exceeded(result, budget, skip_time):
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return failures
+
+    def write_budgets(self, filename, results, reset):
+        budgets = {}
+        if not reset and os.path.exists(filename):
+            budgets = self.read_budgets(filename)
+        added = {name: result for name, result in results.items()
+                 if name not in budgets}
+        budgets.update(added)
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(budgets, f, ensure_ascii=False, indent=4)
+            f.write('\n')
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Бюджет записан в {filename}: '
+            f'новых сценариев {len(added)} ==='
+        ))
@@ -0,0 +1,154 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import Recipe
+
+SERVERS = (
+    ('wsgi', 'foodgram.wsgi', 'sync'),
+    ('asgi', 'foodgram.asgi', 'uvicorn.workers.UvicornWorker'),
+)
+READ_URLS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=24',
+    '/api/recipes/{recipe}/',
+    '/api/tags/',
+    '/api/ingredients/?name=%D0%BA%D0%B0',
+    '/api/users/',
+)
+AUTH_URLS = (
+    '/api/users/subscriptions/',
+    '/api/recipes/?is_favorited=1',
+)
+HOST = 'localhost'
+STARTUP_TIMEOUT = 30
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class Command(BaseCommand):
+    """
+    Сравниваем пропускную способность WSGI и ASGI на текущей базе.
+    Поднимаем gunicorn с одинаковым числом sync и uvicorn воркеров
+    и нагружаем адреса чтения параллельными запросами.
+    Больше одного воркера - только с общим кэшем (CACHE_BACKEND).
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default=1, type=int)
+        parser.add_argument('--concurrency', default=16, type=int,
+                            help='Сколько запросов держать одновременно.')
+        parser.add_argument('--duration', default=10, type=int,
+                            help='Длительность нагрузки в секундах.')
+        parser.add_argument('--port', default=8765, type=int)
+        parser.add_argument('--token', type=str,
+                            help='Токен для адресов, требующих входа.')
+
+    def handle(self, *args, **options):
+        if (options['workers'] > 1 and settings.CACHES['default']['BACKEND']
+                in LOCAL_CACHE_BACKENDS):
+            raise CommandError(
+                'Для --workers больше 1 нужен общий кэш: задайте '
+                'CACHE_BACKEND (например '
+                'django.core.cache.backends.redis.RedisCache) и '
+                'CACHE_LOCATION.'
+            )
+        recipe = Recipe.objects.values_list('pk', flat=True).first()
+        if recipe is None:
+            raise CommandError('В базе нет рецептов для нагрузки.')
+        urls = [url.format(recipe=recipe) for url in READ_URLS]
+        headers = {'Host': HOST}
+        if options['token']:
+            urls.extend(AUTH_URLS)
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        base = f'http://127.0.0.1:{options["port"]}'
+        self.stdout.write(
+            f'Воркеров: {options["workers"]}, одновременных запросов: '
+            f'{options["concurrency"]}, {options["duration"]} с на сервер'
+        )
+        for name, app, worker_class in SERVERS:
+            server = self.start_server(app, worker_class, options)
+            try:
+                self.wait_ready(base, headers, server)
+                result = self.load(base, urls, headers, options)
+            finally:
+                server.terminate()
+                server.wait()
+            self.stdout.write(
+                f'{name}: {result["rps"]:.1f} запросов/с, '
+                f'p50 {result["p50"]:.1f} мс, p95 {result["p95"]:.1f} мс, '
+                f'всего {result["requests"]}, ошибок {result["errors"]}'
+            )
+
+    @staticmethod
+    def start_server(app, worker_class, options):
+        env = {
+            **os.environ,
+            'GUNICORN_BIND': f'127.0.0.1:{options["port"]}',
+            'GUNICORN_WORKERS': str(options['workers']),
+            'GUNICORN_WORKER_CLASS': worker_class,
+        }
+        return subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+             '--log-level', 'warning', app],
+            cwd=settings.BASE_DIR, env=env
+        )
+
+    @staticmethod
+    def wait_ready(base, headers, server):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('Сервер завершился при запуске.')
+            try:
+                urlopen(Request(base + '/api/tags/', headers=headers))
+                return
+            except (URLError, ConnectionError):
+                time.sleep(0.2)
+        raise CommandError('Сервер не запустился.')
+
+    @staticmethod
+    def load(base, urls, headers, options):
+        deadline = time.monotonic() + options['duration']
+
+        def client(offset):
+            latencies, errors = [], 0
+            for url in cycle(urls[offset:] + urls[:offset]):
+                if time.monotonic() >= deadline:
+                    return latencies, errors
+                started = time.perf_counter()
+                try:
+                    with urlopen(Request(base + url, headers=headers)) as r:
+                        r.read()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                except (HTTPError, URLError, ConnectionError):
+                    errors += 1
+
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(
+                client,
+                (i % len(urls) for i in range(options['concurrency']))
+            ))
+        latencies = sorted(latency for result, _ in results
+                           for latency in result)
+        if not latencies:
+            raise CommandError('Ни один запрос не выполнен успешно.')
+        return {
+            'requests': len(latencies),
+            'errors': sum(errors for _, errors in results),
+            'rps': len(latencies) / options['duration'],
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95)],
+        }
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import get_fragment_stats
+
+
+class Command(BaseCommand):
+    """Выводим статистику кэша фрагментов рецептов."""
+
+    def handle(self, *args, **options):
+        stats = get_fragment_stats()
+        total = stats['hits'] + stats['rebuilds']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, пересборок: {stats["rebuilds"]}, '
+            f'доля попаданий: {ratio:.1%}'
+        )
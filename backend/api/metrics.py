@@ -0,0 +1,169 @@
+import logging
+import os
+from collections import defaultdict
+from contextlib import ExitStack
+from time import perf_counter
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from prometheus_client.core import CounterMetricFamily
+
+from .cache import get_fragment_stats
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+UNMATCHED = 'unmatched'
+ROUTE_LABELS = ('view', 'method')
+
+# При заданном PROMETHEUS_MULTIPROC_DIR значения пишутся в файлы каталога,
+# и адрес /metrics собирает их со всех воркеров gunicorn.
+REQUEST_DURATION = Histogram('foodgram_request_duration_seconds',
+                             'Время ответа.', ROUTE_LABELS, buckets=BUCKETS)
+REQUESTS = Counter('foodgram_requests', 'Ответы по статусам.',
+                   (*ROUTE_LABELS, 'status'))
+REQUEST_DB_QUERIES = Counter('foodgram_request_db_queries',
+                             'SQL-запросы по маршрутам.', ROUTE_LABELS)
+REQUEST_DB_DURATION = Counter('foodgram_request_db_duration_seconds',
+                              'Время в базе по маршрутам.', ROUTE_LABELS)
+DB_QUERIES = Counter('foodgram_db_queries', 'SQL-запросы по базам.',
+                     ('alias',))
+DB_DURATION = Counter('foodgram_db_duration_seconds',
+                      'Время в базе по базам.', ('alias',))
+
+
+class FragmentStatsCollector:
+    """Попадания в кэш карточек рецептов, счетчики лежат в общем кэше."""
+
+    def collect(self):
+        family = CounterMetricFamily('foodgram_recipe_fragments',
+                                     'Карточки рецептов из кэша.',
+                                     labels=('result',))
+        for result, count in get_fragment_stats().items():
+            family.add_metric((result,), count)
+        yield family
+
+
+fragment_stats = FragmentStatsCollector()
+REGISTRY.register(fragment_stats)
+
+
+def observe(view, method, total, timer, status):
+    REQUEST_DURATION.labels(view, method).observe(total)
+    REQUESTS.labels(view, method, status).inc()
+    REQUEST_DB_QUERIES.labels(view, method).inc(timer.count)
+    REQUEST_DB_DURATION.labels(view, method).inc(timer.duration)
+    for alias, (queries, db_time) in timer.aliases.items():
+        DB_QUERIES.labels(alias).inc(queries)
+        DB_DURATION.labels(alias).inc(db_time)
+
+
+class QueryTimer:
+    """
+    Обертка курсора: считает запросы, их время и самый долгий.
+    Число и время запросов копятся и отдельно по каждой базе.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = (0.0, None)
+        self.aliases = defaultdict(lambda: [0, 0.0])
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            alias = self.aliases[context['connection'].alias]
+            alias[0] += 1
+            alias[1] += duration
+            if duration > self.slowest[0]:
+                self.slowest = (duration, sql)
+
+
+class RequestMetricsMiddleware:
+    """
+    Замеряет каждый запрос: число SQL-запросов, время в базе и общее.
+    Добавляет заголовок Server-Timing, пишет в лог медленные запросы
+    вместе с самым долгим SQL и копит гистограммы по маршрутам.
+    Работает и под WSGI, и под ASGI без лишнего перехода между потоками.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer, started = QueryTimer(), perf_counter()
+        with self.wrap_connections(timer):
+            response = self.get_response(request)
+        return self.finish(request, response, timer, started)
+
+    async def __acall__(self, request):
+        # Соединения с базой у каждого потока свои, а синхронный код
+        # запроса выполняется в отдельном потоке. Обертки ставятся там же.
+        timer, started = QueryTimer(), perf_counter()
+        stack = await sync_to_async(self.wrap_connections)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, timer, started)
+
+    @staticmethod
+    def wrap_connections(timer):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        return stack
+
+    @staticmethod
+    def finish(request, response, timer, started):
+        total = perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNMATCHED
+        observe(view, request.method, total, timer, response.status_code)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} SQL"',
+            *(f'db-{alias};dur={db_time * 1000:.1f};desc="{queries} SQL"'
+              for alias, (queries, db_time) in sorted(timer.aliases.items())),
+            f'total;dur={total * 1000:.1f}',
+        ))
+        if total * 1000 >= settings.SLOW_REQUEST_THRESHOLD:
+            duration, sql = timer.slowest
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, SQL: %s за %.0f мс, '
+                'самый долгий %.0f мс: %s',
+                request.method, request.get_full_path(), view, total * 1000,
+                timer.count, timer.duration * 1000, duration * 1000, sql or '-'
+            )
+        return response
+
+
+def metrics(request):
+    """
+    Метрики в текстовом формате Prometheus.
+    В режиме нескольких процессов суммируются значения всех воркеров.
+    """
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(fragment_stats)
+    return HttpResponse(generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
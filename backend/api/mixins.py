@@ -0,0 +1,65 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import get_version
+from .replicas import read_primary
+
+
+class CachedReadMixin:
+    """
+    Кэширует готовые ответы list/retrieve для справочных данных.
+    Ключ строится из версий моделей cache_models и строки запроса,
+    ответы помечаются ETag и Last-Modified, а повторный запрос
+    с If-None-Match получает 304 без обращения к базе.
+    Кэшируется только JSON: страницы browsable API зависят от пользователя.
+    Промах кэша читается из основной базы, а не из реплики.
+    """
+    cache_models = ()
+    cache_timeout = settings.REFERENCE_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, super().retrieve, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        versions = ':'.join(str(get_version(model))
+                            for model in self.cache_models)
+        query = hashlib.md5(
+            f'{request.get_full_path()}|{request.accepted_media_type}'
+            .encode()
+        ).hexdigest()
+        return f'response:{self.basename}:{self.action}:{versions}:{query}'
+
+    def cached(self, request, handler, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            with read_primary():
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response.accepted_renderer = request.accepted_renderer
+                response.accepted_media_type = request.accepted_media_type
+                response.renderer_context = self.get_renderer_context()
+                response.render()
+            entry = (response.content, response['Content-Type'],
+                     quote_etag(hashlib.sha256(response.content).hexdigest()),
+                     int(time.time()))
+            cache.set(key, entry, self.cache_timeout)
+        content, content_type, etag, last_modified = entry
+        response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return get_conditional_response(request, etag=etag,
+                                        last_modified=last_modified,
+                                        response=response)
@@ -1,5 +1,58 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from app.models import POPULAR_ORDERING
 
 
 class LimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Пагинация по ключу (pub_date, id) без COUNT и OFFSET.
+    С ordering=popular ключом служит счетчик избранного.
+    """
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipePagination(LimitPagination):
+    """
+    Пагинация рецептов по номеру страницы.
+    С параметром pagination=cursor или cursor переключается на пагинацию
+    по ключу для бесконечной ленты.
+    """
+    cursor_class = RecipeCursorPagination
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.cursor_class.cursor_query_param
+                in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedCursorPagination(CursorPagination):
+    """Пагинация ленты подписок по ключу (дата в ленте, рецепт)."""
+    page_size_query_param = 'limit'
+    ordering = ('-feed_date', '-feed_recipe')
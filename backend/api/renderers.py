@@ -0,0 +1,126 @@
+import csv
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+FONT_NAME = 'Arial'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'data', 'arial.ttf')
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Регистрирует шрифт с кириллицей один раз на процесс."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    return FONT_NAME
+
+
+class ShoppingListRenderer(BaseRenderer, ABC):
+    """
+    Базовый рендерер списка покупок.
+    Формат выбирается параметром format или заголовком Accept.
+    Сообщения об ошибках отдаются как JSON, см. RecipeViewSet.
+    """
+
+    def header(self, user):
+        return ('Список покупок', user.username,
+                datetime.now().strftime('%d/%m/%Y %H:%M'))
+
+    @abstractmethod
+    def stream(self, user, ingredients):
+        """Построчно отдает файл по итератору ингредиентов."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Собирает файл целиком из потока, когда ответ - не поток."""
+        user = renderer_context['request'].user
+        return b''.join(
+            chunk.encode(self.charset) if isinstance(chunk, str) else chunk
+            for chunk in self.stream(user, data)
+        )
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def stream(self, user, ingredients):
+        title, username, date = self.header(user)
+        yield f'{title}\n\n{username}\n{date}\n\n'
+        for ing in ingredients:
+            yield (
+                f'{ing["ingredients"]} - {ing["amount"]}, {ing["measure"]}\n'
+            )
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def stream(self, user, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('Ингредиент', 'Количество',
+                               'Единица измерения'))
+        for ing in ingredients:
+            yield writer.writerow(
+                (ing['ingredients'], ing['amount'], ing['measure'])
+            )
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+    font_size = 12
+    line_height = 18
+    margin = 50
+
+    def stream(self, user, ingredients):
+        """
+        PDF собирается целиком при сохранении документа,
+        поэтому построчно отдается уже готовый буфер.
+        """
+        font = register_font()
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        y = height - self.margin
+        for line in (*self.header(user), ''):
+            pdf.setFont(font, self.font_size)
+            pdf.drawString(self.margin, y, line)
+            y -= self.line_height
+        for ing in ingredients:
+            if y < self.margin:
+                pdf.showPage()
+                y = height - self.margin
+            pdf.setFont(font, self.font_size)
+            pdf.drawString(
+                self.margin, y,
+                f'{ing["ingredients"]} - {ing["amount"]}, {ing["measure"]}'
+            )
+            y -= self.line_height
+        pdf.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
+
+
+SHOPPING_LIST_RENDERERS = (TxtShoppingListRenderer, CsvShoppingListRenderer,
+                           PdfShoppingListRenderer)
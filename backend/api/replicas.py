@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hashlib import md5
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_CACHE_KEY = 'replicas:sticky:{}'
+# Токены и сессии меняются при входе, когда ключ клиента еще неизвестен,
+# поэтому их всегда читаем из основной базы.
+PRIMARY_MODELS = {'authtoken.token', 'sessions.session'}
+
+use_replica = ContextVar('use_replica', default=False)
+
+
+def sticky_key(request):
+    """
+    Ключ клиента по токену или сессии. У анонимного клиента ключа нет:
+    адрес за nginx общий, и одна запись закрепила бы всех анонимов.
+    """
+    client = (request.META.get('HTTP_AUTHORIZATION')
+              or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if not client:
+        return None
+    return STICKY_CACHE_KEY.format(md5(client.encode()).hexdigest())
+
+
+@contextmanager
+def read_primary():
+    """
+    Чтение внутри блока идет в основную базу.
+    Нужно для заполнения кэша: ключ строится из версий, выставленных при
+    записи в основную базу, и отстающая реплика положила бы под новый
+    ключ старые данные.
+    """
+    token = use_replica.set(False)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Чтение внутри запросов GET идет в реплику, все остальное - в основную.
+    Внутри транзакции читаем из основной, чтобы видеть свои же записи.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if (use_replica.get() and REPLICA_DB_ALIAS in connections
+                and model._meta.label_lower not in PRIMARY_MODELS
+                and not connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """
+    Разрешает чтение из реплики для безопасных запросов.
+    После успешной записи клиент на REPLICA_STICKY_SECONDS закрепляется
+    за основной базой, чтобы сразу видеть свои изменения.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = use_replica.set(self.can_use_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        self.remember_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        replica = await sync_to_async(self.can_use_replica)(request)
+        token = use_replica.set(replica)
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        await sync_to_async(self.remember_write)(request, response)
+        return response
+
+    @staticmethod
+    def can_use_replica(request):
+        if (REPLICA_DB_ALIAS not in connections
+                or request.method not in SAFE_METHODS):
+            return False
+        key = sticky_key(request)
+        return key is None or cache.get(key) is None
+
+    @staticmethod
+    def remember_write(request, response):
+        key = sticky_key(request)
+        if (key is not None and REPLICA_DB_ALIAS in connections
+                and request.method not in SAFE_METHODS
+                and response.status_code < 400):
+            cache.set(key, 1, settings.REPLICA_STICKY_SECONDS)
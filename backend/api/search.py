@@ -0,0 +1,224 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.conf import settings
+
+from app.models import Ingredient, IngredientsAmount, Tag
+
+from .cache import get_version
+from .replicas import read_primary
+
+NGRAM_SIZE = 3
+PREFIX_END = '\U0010ffff'
+
+
+def ngrams(value, size):
+    return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+    Строится при первом поиске, сбрасывается при изменении ингредиентов,
+    в том числе в другом процессе - по общей версии Ingredient в кэше,
+    и по истечении INGREDIENT_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._data = None
+
+    @read_primary()
+    def build(self):
+        ingredients = sorted(Ingredient.objects.all(),
+                             key=lambda obj: (obj.name.casefold(), obj.id))
+        names = [ingredient.name.casefold() for ingredient in ingredients]
+        postings = defaultdict(set)
+        for position, name in enumerate(names):
+            for size in range(1, NGRAM_SIZE + 1):
+                for gram in ngrams(name, size):
+                    postings[gram].add(position)
+        return ingredients, names, dict(postings)
+
+    def get_data(self):
+        version = get_version(Ingredient)
+        data = self._data
+        if (data is None or self._version != version
+                or time.monotonic() - self._built_at
+                > settings.INGREDIENT_INDEX_TTL):
+            with self._lock:
+                if self._data is None or data is self._data:
+                    self._data = self.build()
+                    self._version = version
+                    self._built_at = time.monotonic()
+                data = self._data
+        return data
+
+    def search(self, value, limit=None):
+        """
+        Ингредиенты, название которых содержит value.
+        Сначала начинающиеся с value, затем остальные, по алфавиту.
+        """
+        ingredients, names, postings = self.get_data()
+        value = value.casefold()
+        start = bisect_left(names, value)
+        end = bisect_left(names, value + PREFIX_END, lo=start)
+        result = list(range(start, end))
+        if limit is None or len(result) < limit:
+            grams = sorted(
+                (postings.get(gram, set())
+                 for gram in ngrams(value, min(len(value), NGRAM_SIZE))),
+                key=len
+            )
+            candidates = set.intersection(*grams) if grams else set()
+            result.extend(
+                position for position in sorted(candidates)
+                if not start <= position < end and value in names[position]
+            )
+        return [ingredients[position] for position in result[:limit]]
+
+
+ingredient_index = IngredientIndex()
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс рецептов по ингредиентам в памяти процесса.
+    Для каждого ингредиента хранит отсортированный список id рецептов.
+    Строится из IngredientsAmount при первом поиске, обновляется при
+    создании, изменении и удалении рецептов через API и целиком
+    перестраивается по истечении RECIPE_INGREDIENT_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._data = None
+
+    @read_primary()
+    def build(self):
+        postings = defaultdict(lambda: array('I'))
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in (
+                IngredientsAmount.objects.order_by('recipe_id')
+                .values_list('recipe_id', 'ingredient_id').iterator()):
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        return dict(postings), {recipe_id: frozenset(ingredients)
+                                for recipe_id, ingredients in recipes.items()}
+
+    def get_data(self):
+        data = self._data
+        if (data is None
+                or time.monotonic() - self._built_at
+                > settings.RECIPE_INGREDIENT_INDEX_TTL):
+            with self._lock:
+                if self._data is None or data is self._data:
+                    self._data = self.build()
+                    self._built_at = time.monotonic()
+                data = self._data
+        return data
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        """
+        Заменяет ингредиенты рецепта в индексе.
+        Списки не меняются на месте: затронутые копируются и подменяются,
+        поэтому параллельный поиск видит либо старую, либо новую версию.
+        """
+        with self._lock:
+            if self._data is None:
+                return
+            postings, recipes = self._data
+            old = recipes.get(recipe_id, frozenset())
+            new = frozenset(ingredient_ids)
+            for ingredient_id in old - new:
+                posting = array('I', postings[ingredient_id])
+                del posting[bisect_left(posting, recipe_id)]
+                postings[ingredient_id] = posting
+            for ingredient_id in new - old:
+                posting = array('I', postings.get(ingredient_id, ()))
+                insort(posting, recipe_id)
+                postings[ingredient_id] = posting
+            if new:
+                recipes[recipe_id] = new
+            else:
+                recipes.pop(recipe_id, None)
+
+    def remove_recipe(self, recipe_id):
+        self.set_recipe(recipe_id, ())
+
+    def search(self, ingredient_ids, limit):
+        """
+        Рецепты, в которых есть хоть один из ingredient_ids.
+        Возвращает не больше limit троек (id рецепта, есть, не хватает):
+        сначала рецепты с наименьшим числом недостающих ингредиентов,
+        затем с наибольшим числом имеющихся, затем новые.
+        """
+        postings, recipes = self.get_data()
+        matched = Counter(chain.from_iterable(
+            postings.get(ingredient_id, ()) for ingredient_id in
+            set(ingredient_ids)
+        ))
+        ranked = heapq.nsmallest(limit, (
+            (max(len(recipes.get(recipe_id, ())) - count, 0), -count,
+             -recipe_id)
+            for recipe_id, count in matched.items()
+        ))
+        return [(-recipe_id, -count, missing)
+                for missing, count, recipe_id in ranked]
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+class TagBits:
+    """
+    Соответствие слага тега его биту в маске рецепта, в памяти процесса.
+    Сбрасывается при изменении тегов, в том числе в другом процессе -
+    по общей версии Tag в кэше, и по истечении TAG_BITS_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._data = None
+
+    def get(self):
+        version = get_version(Tag)
+        data = self._data
+        if (data is None or self._version != version
+                or time.monotonic() - self._built_at > settings.TAG_BITS_TTL):
+            with self._lock:
+                if self._data is None or data is self._data:
+                    with read_primary():
+                        self._data = dict(
+                            Tag.objects.values_list('slug', 'bit')
+                        )
+                    self._version = version
+                    self._built_at = time.monotonic()
+                data = self._data
+        return data
+
+
+tag_bits = TagBits()
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_bits.get()]
@@ -1,18 +1,28 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Manager
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 
 from app.models import (Favorite, Ingredient, IngredientsAmount, Recipe,
-                        ShoppingCart, Tag)
-from users.models import CustomUser, Follow
+                        ShoppingCart, ShoppingListItem, Tag, TimelineEntry,
+                        change_counter)
+from users.models import CustomUser
 
-from .utils import Base64ImageField
+from .cache import get_recipe_fragments
+from .replicas import read_primary
+from .search import recipe_ingredient_index
+from .utils import Base64ImageField, ThumbnailsField, get_subscriptions
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для краткого отображения сведений о рецепте"""
+    thumbnails = ThumbnailsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
         read_only_fields = ['__all__']
 
 
@@ -26,16 +36,12 @@ class CustomUserSerializer(UserSerializer):
                   'first_name', 'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=user, author=obj.id).exists()
+        return obj.id in get_subscriptions(self.context.get('request'))
 
 
 class FollowSerializer(serializers.ModelSerializer):
     """Сериализатор добавления/удаления подписки, просмотра подписок."""
     recipes = ShortRecipeSerializer(read_only=True, many=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta(CustomUserSerializer.Meta):
@@ -44,20 +50,14 @@ class FollowSerializer(serializers.ModelSerializer):
         read_only_fields = ['__all__']
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=user, author=obj.id).exists()
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.id in get_subscriptions(self.context.get('request'))
 
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для тегов."""
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ('id', 'name', 'color', 'slug')
         read_only_fields = ['__all__']
 
 
@@ -82,33 +82,104 @@ class IngredientsAmountSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
-    """Сериализатор для отображения рецептов."""
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор не зависящей от пользователя части рецепта.
+    Результат кэшируется, поэтому картинка отдается относительным адресом.
+    """
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField()
+    thumbnails = ThumbnailsField(source='image')
     ingredients = serializers.SerializerMethodField(read_only=True)
     tags = TagSerializer(read_only=True, many=True)
-    is_favorited = serializers.SerializerMethodField(read_only=True)
-    is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Recipe
-        fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+        fields = ('id', 'tags', 'author', 'ingredients', 'name', 'image',
+                  'thumbnails', 'text', 'cooking_time')
         read_only_fields = ['__all__']
 
     def get_ingredients(self, obj):
-        queryset = IngredientsAmount.objects.filter(recipe=obj)
-        return IngredientsAmountSerializer(queryset, many=True).data
+        return IngredientsAmountSerializer(obj.amounts.all(), many=True).data
+
+
+class RecipeListListSerializer(serializers.ListSerializer):
+    """Отображение списка рецептов одним обращением к кэшу фрагментов."""
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        return self.child.represent(list(data))
+
+
+class RecipeListSerializer(RecipeFragmentSerializer):
+    """
+    Сериализатор для отображения рецептов.
+    Общая часть берется из кэша фрагментов, поля пользователя
+    (is_favorited, is_in_shopping_cart, author.is_subscribed)
+    добавляются при каждом ответе.
+    """
+    is_favorited = serializers.SerializerMethodField(read_only=True)
+    is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+
+    class Meta(RecipeFragmentSerializer.Meta):
+        fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
+                  'is_in_shopping_cart', 'name', 'image', 'thumbnails',
+                  'text', 'cooking_time')
+        list_serializer_class = RecipeListListSerializer
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    @staticmethod
+    @read_primary()
+    def build_fragments(ids):
+        recipes = Recipe.objects.with_related().filter(pk__in=ids)
+        return {
+            recipe.id: RecipeFragmentSerializer(recipe).data
+            for recipe in recipes
+        }
+
+    def represent(self, recipes):
+        request = self.context.get('request')
+        fragments = get_recipe_fragments(recipes, self.build_fragments)
+        result = []
+        for recipe in recipes:
+            if recipe.id not in fragments:
+                continue
+            data = dict(fragments[recipe.id])
+            data['author'] = dict(
+                data['author'],
+                is_subscribed=self.get_author_is_subscribed(recipe, request)
+            )
+            data['is_favorited'] = self.get_is_favorited(recipe)
+            data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(recipe)
+            if request is not None and data['image']:
+                data['image'] = request.build_absolute_uri(data['image'])
+                data['thumbnails'] = {
+                    rendition: request.build_absolute_uri(url)
+                    for rendition, url in data['thumbnails'].items()
+                }
+            result.append({field: data[field] for field in self.Meta.fields})
+        return result
+
+    @staticmethod
+    def get_author_is_subscribed(obj, request):
+        if hasattr(obj, 'author_is_subscribed'):
+            return obj.author_is_subscribed
+        return obj.author_id in get_subscriptions(request)
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return obj.favorites.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -178,6 +249,14 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             )
         return data
 
+    @staticmethod
+    def index_ingredients(ingredients, recipe):
+        """После коммита обновляет рецепт в обратном индексе."""
+        transaction.on_commit(partial(
+            recipe_ingredient_index.set_recipe, recipe.id,
+            [ingredient['id'].id for ingredient in ingredients]
+        ))
+
     @staticmethod
     def create_ingredients(ingredients, recipe):
         ingredients = [
@@ -189,15 +268,57 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         ]
         IngredientsAmount.objects.bulk_create(ingredients)
 
+    @staticmethod
+    def update_ingredients(ingredients, recipe):
+        """
+        Приводит ингредиенты рецепта к переданным: добавляет новые,
+        меняет кол-во изменившихся и удаляет лишние.
+        Возвращает id затронутых ингредиентов.
+        """
+        existing = {
+            amount.ingredient_id: amount for amount in recipe.amounts.all()
+        }
+        submitted = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = existing.keys() - submitted.keys()
+        created, updated = [], []
+        for ingredient_id, amount in submitted.items():
+            if ingredient_id not in existing:
+                created.append(IngredientsAmount(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                ))
+            elif existing[ingredient_id].amount != amount:
+                existing[ingredient_id].amount = amount
+                updated.append(existing[ingredient_id])
+
+        if removed:
+            recipe.amounts.filter(ingredient__in=removed).delete()
+        if updated:
+            IngredientsAmount.objects.bulk_update(updated, ('amount',))
+        if created:
+            IngredientsAmount.objects.bulk_create(created)
+        return removed.union(
+            amount.ingredient_id for amount in (*created, *updated)
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         image = validated_data.pop('image')
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(image=image, **validated_data)
+        recipe = Recipe.objects.create(image=image, tags_mask=Tag.mask(tags),
+                                       **validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        self.index_ingredients(ingredients, recipe)
+        change_counter(CustomUser.objects.filter(pk=recipe.author_id),
+                       'recipes_count', 1)
+        TimelineEntry.objects.fan_out([recipe])
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         tags = validated_data.get('tags')
         ingredients = validated_data.get('ingredients')
@@ -208,12 +329,15 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
                                                  recipe.cooking_time)
 
         if tags:
-            recipe.tags.clear()
             recipe.tags.set(tags)
+            recipe.tags_mask = Tag.mask(tags)
 
         if ingredients:
-            recipe.ingredients.clear()
-            self.create_ingredients(ingredients, recipe)
+            changed = self.update_ingredients(ingredients, recipe)
+            self.index_ingredients(ingredients, recipe)
+            ShoppingListItem.objects.refresh_recipe(
+                recipe, ingredients=changed
+            )
 
         recipe.save()
         return recipe
@@ -248,3 +372,12 @@ class ShoppingCartSerializer(FavoriteRecipeSerializer):
     """Сериализатор для добавления/удаления рецепта в список покупок."""
     class Meta(FavoriteRecipeSerializer.Meta):
         model = ShoppingCart
+
+
+class RecipesByIngredientsSerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=100
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
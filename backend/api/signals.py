@@ -0,0 +1,102 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from app.models import Ingredient, IngredientsAmount, Recipe, Tag
+
+from .authentication import token_cache
+from .cache import bump_version
+from .search import ingredient_index, recipe_ingredient_index, tag_bits
+
+User = get_user_model()
+
+
+def bump_recipe(pk):
+    """
+    Меняет версию рецепта сейчас и еще раз после фиксации транзакции:
+    фрагмент, собранный параллельным запросом из старых строк, иначе
+    остался бы в кэше под новой версией.
+    """
+    bump_version(Recipe, pk)
+    transaction.on_commit(partial(bump_version, Recipe, pk))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_bits(sender, **kwargs):
+    tag_bits.invalidate()
+    transaction.on_commit(partial(bump_version, sender))
+
+
+@receiver(post_delete, sender=Tag)
+def clear_tag_bit(instance, **kwargs):
+    bit = 1 << instance.bit
+    Recipe.objects.alias(tag_bit=F('tags_mask').bitand(bit)).filter(
+        tag_bit__gt=0
+    ).update(tags_mask=F('tags_mask') - bit)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def bump_reference_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_index(instance, **kwargs):
+    transaction.on_commit(
+        partial(recipe_ingredient_index.remove_recipe, instance.pk)
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def bump_recipe_version(instance, **kwargs):
+    bump_recipe(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=User)
+def bump_user_version(instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_version(User, instance.pk)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    token_cache.invalidate_user(instance.pk)
+    # Снимок, загруженный до завершения транзакции, содержит старые данные
+    # под новой версией: после фиксации версия меняется еще раз.
+    transaction.on_commit(partial(bump_version, User, instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    token_cache.invalidate(instance.key)
+    transaction.on_commit(partial(token_cache.invalidate, instance.key))
+
+
+@receiver((post_save, post_delete), sender=IngredientsAmount)
+def bump_recipe_version_on_amount(instance, **kwargs):
+    bump_recipe(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_version_on_tags(instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        bump_version(Tag)
+        transaction.on_commit(partial(bump_version, Tag))
+    else:
+        bump_recipe(instance.pk)
@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache, token_digest
+from api.cache import bump_version, version_key
+
+from .utils import create_user
+
+User = get_user_model()
+URL = '/api/tags/'
+
+
+class TokenCacheTests(TestCase):
+    """
+    Снимок токена берется из памяти процесса, пока не сменились версии
+    в общем кэше. Другой воркер меняет только общие версии: локальный
+    снимок он не видит.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.client.get(URL).status_code, 200)
+        self.addCleanup(token_cache.invalidate_user, self.user.pk)
+
+    def queries(self):
+        with CaptureQueriesContext(connection) as context:
+            status = self.client.get(URL).status_code
+        return status, len(context.captured_queries)
+
+    def test_snapshot_is_reused(self):
+        self.assertEqual(self.queries(), (200, 0))
+
+    def test_logout_in_other_process(self):
+        Token.objects.filter(pk=self.token.pk)._raw_delete(connection.alias)
+        self.assertEqual(self.queries(), (200, 0))
+        bump_version(Token, token_digest(self.token.key))
+        self.assertEqual(self.client.get(URL).status_code, 401)
+
+    def test_user_blocked_in_other_process(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        bump_version(User, self.user.pk)
+        self.assertEqual(self.client.get(URL).status_code, 401)
+
+    def test_evicted_version_reloads_snapshot(self):
+        cache.delete(version_key(Token, token_digest(self.token.key)))
+        self.assertEqual(self.queries(), (200, 1))
+        self.assertEqual(self.queries(), (200, 0))
+
+    def test_logout(self):
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(URL).status_code, 401)
+
+    def test_user_change(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(URL).status_code, 401)
@@ -0,0 +1,26 @@
+import tempfile
+
+from django.test import TransactionTestCase, override_settings
+
+from api.management.commands.benchmark_endpoints import BUDGETS_FILE, Command
+
+
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Число SQL-запросов каждого сценария не выше записанного бюджета.
+    Сценарии идут вне транзакции теста, как и в benchmark_endpoints.
+    """
+
+    def test_scenarios_within_query_budget(self):
+        command = Command()
+        budgets = command.read_budgets(BUDGETS_FILE)
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            results = command.run_scenarios(repeat=1)
+        self.assertEqual(set(results), set(budgets))
+        for name, result in results.items():
+            with self.subTest(name):
+                self.assertEqual(
+                    command.exceeded(result, budgets[name], skip_time=True),
+                    []
+                )
@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.search import recipe_ingredient_index
+
+from .utils import create_ingredient, create_recipe, create_tag, create_user
+
+URL = '/api/recipes/by-ingredients/'
+
+
+class RecipesByIngredientsTests(TestCase):
+    """Подбор рецептов по имеющимся ингредиентам."""
+
+    def setUp(self):
+        cache.clear()
+        recipe_ingredient_index.invalidate()
+        self.author = create_user('author')
+        self.tag = create_tag('lunch')
+        self.a, self.b, self.c, self.d = (
+            create_ingredient(name) for name in ('мука', 'яйца', 'сахар',
+                                                 'соль')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def recipe(self, name, ingredients):
+        return create_recipe(self.author, name, [self.tag], ingredients).id
+
+    def search(self, *ingredients, limit=10):
+        response = self.client.get(URL, {
+            'ingredients': [ingredient.id for ingredient in ingredients],
+            'limit': limit
+        })
+        self.assertEqual(response.status_code, 200)
+        return [(item['id'], item['matched_ingredients'],
+                 item['missing_ingredients']) for item in response.json()]
+
+    def test_ranking(self):
+        three = self.recipe('Пирог', [self.a, self.b, self.c])
+        one = self.recipe('Лепешка', [self.a])
+        both = self.recipe('Блины', [self.a, self.b])
+        older = self.recipe('Хлеб', [self.a, self.d])
+        newer = self.recipe('Омлет', [self.b, self.d])
+        self.recipe('Сироп', [self.c])
+        self.assertEqual(self.search(self.a, self.b), [
+            (both, 2, 0), (one, 1, 0), (three, 2, 1),
+            (newer, 1, 1), (older, 1, 1),
+        ])
+        self.assertEqual(self.search(self.a, self.b, limit=2),
+                         [(both, 2, 0), (one, 1, 0)])
+
+    def test_index_follows_update_and_delete(self):
+        recipe = self.recipe('Блины', [self.a, self.b])
+        kept = self.recipe('Хлеб', [self.a])
+        self.assertEqual(self.search(self.a, self.c),
+                         [(kept, 1, 0), (recipe, 1, 1)])
+        with mock.patch.object(recipe_ingredient_index, 'build',
+                               side_effect=AssertionError), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/recipes/{recipe}/', {
+                'name': 'Блины', 'text': 'Описание', 'cooking_time': 10,
+                'tags': [self.tag.id],
+                'ingredients': [{'id': self.c.id, 'amount': 100},
+                                {'id': self.d.id, 'amount': 5}],
+            }, format='json')
+            self.assertEqual(response.status_code, 200)
+        with mock.patch.object(recipe_ingredient_index, 'build',
+                               side_effect=AssertionError):
+            self.assertEqual(self.search(self.a, self.c),
+                             [(kept, 1, 0), (recipe, 1, 1)])
+            self.assertEqual(self.search(self.b), [])
+            self.assertEqual(self.search(self.d), [(recipe, 1, 1)])
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(f'/api/recipes/{recipe}/')
+                self.assertEqual(response.status_code, 204)
+            self.assertEqual(self.search(self.a, self.c, self.d),
+                             [(kept, 1, 0)])
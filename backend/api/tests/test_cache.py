@@ -0,0 +1,96 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.cache import bump_version, get_version, get_versions, version_key
+from app.models import Recipe, Tag
+
+from .utils import create_ingredient, create_recipe, create_tag, create_user
+
+
+class VersionTests(TestCase):
+    """Версии меняются при каждом изменении и не повторяются."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_changes_version(self):
+        seen = {get_version(Tag)}
+        for _ in range(5):
+            bump_version(Tag)
+            seen.add(get_version(Tag))
+        self.assertEqual(len(seen), 6)
+
+    def test_evicted_version_is_not_reused(self):
+        seen = {get_version(Tag)}
+        for _ in range(5):
+            cache.delete(version_key(Tag))
+            seen.add(get_version(Tag))
+        self.assertEqual(len(seen), 6)
+
+    def test_missing_version_keeps_concurrent_bump(self):
+        bump_version(Recipe, 1)
+        bumped = cache.get(version_key(Recipe, 1))
+        self.assertEqual(get_versions(Recipe, [1, 2])[1], bumped)
+
+
+class CacheInvalidationTests(TestCase):
+    """Изменения сразу видны в закэшированных ответах."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.tag = create_tag('lunch')
+        self.recipe = create_recipe(self.author, 'Борщ', [self.tag],
+                                    [create_ingredient('свекла')])
+        self.client = APIClient()
+
+    def recipe_list(self):
+        return self.client.get('/api/recipes/').json()['results']
+
+    def test_recipe_change(self):
+        self.assertEqual(self.recipe_list()[0]['name'], 'Борщ')
+        self.recipe.name = 'Щи'
+        self.recipe.save()
+        self.assertEqual(self.recipe_list()[0]['name'], 'Щи')
+        detail = self.client.get(f'/api/recipes/{self.recipe.id}/').json()
+        self.assertEqual(detail['name'], 'Щи')
+
+    def test_author_change(self):
+        self.recipe_list()
+        self.author.first_name = 'Новое'
+        self.author.save()
+        self.assertEqual(self.recipe_list()[0]['author']['first_name'],
+                         'Новое')
+
+    def test_tag_change(self):
+        self.assertEqual(self.client.get('/api/tags/').json()[0]['name'],
+                         'lunch')
+        self.recipe_list()
+        self.tag.name = 'Обед'
+        self.tag.save()
+        self.assertEqual(self.client.get('/api/tags/').json()[0]['name'],
+                         'Обед')
+        self.assertEqual(self.recipe_list()[0]['tags'][0]['name'], 'Обед')
+
+    def test_tags_not_modified(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.tag.name = 'Обед'
+        self.tag.save()
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_fragment_built_before_commit(self):
+        """Фрагмент из старых строк, собранный до фиксации, не читается."""
+        self.recipe_list()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.recipe.name = 'Щи'
+            self.recipe.save()
+            Recipe.objects.filter(pk=self.recipe.pk).update(name='Борщ')
+            self.recipe_list()
+            Recipe.objects.filter(pk=self.recipe.pk).update(name='Щи')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.recipe_list()[0]['name'], 'Щи')
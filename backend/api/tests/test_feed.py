@@ -0,0 +1,94 @@
+import base64
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.benchmarks import png
+from app.models import TimelineEntry
+
+from .utils import create_ingredient, create_recipe, create_tag, create_user
+
+
+class FeedTests(TestCase):
+    """Лента подписок: раскладка, добор, очистка и чтение."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('follower')
+        self.author = create_user('author')
+        self.tag = create_tag('lunch')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def subscribe(self, author, client=None):
+        response = (client or self.client).post(
+            f'/api/users/{author.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def feed(self):
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def timeline(self):
+        return list(TimelineEntry.objects.filter(user=self.user)
+                    .order_by('-pub_date', '-recipe')
+                    .values_list('recipe', flat=True))
+
+    def test_new_recipe_fanned_out(self):
+        self.subscribe(self.author)
+        client = APIClient()
+        client.force_authenticate(self.author)
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            response = client.post('/api/recipes/', {
+                'name': 'Борщ', 'text': 'Описание', 'cooking_time': 10,
+                'image': ('data:image/png;base64,'
+                          + base64.b64encode(png()).decode()),
+                'tags': [self.tag.id],
+                'ingredients': [{'id': create_ingredient('свекла').id,
+                                 'amount': 100}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe = response.json()['id']
+        self.assertEqual(self.timeline(), [recipe])
+        self.assertEqual(self.feed(), [recipe])
+
+    @override_settings(FEED_BACKFILL_SIZE=2)
+    def test_subscribe_backfills_latest_recipes(self):
+        recipes = [create_recipe(self.author, f'Рецепт {i}').id
+                   for i in range(3)]
+        self.subscribe(self.author)
+        self.assertEqual(self.timeline(), recipes[:0:-1])
+        self.assertEqual(self.feed(), recipes[:0:-1])
+
+    def test_unsubscribe_prunes_timeline(self):
+        other = create_user('other')
+        kept = create_recipe(other, 'Щи').id
+        create_recipe(self.author, 'Борщ')
+        self.subscribe(self.author)
+        self.subscribe(other)
+        response = self.client.delete(
+            f'/api/users/{self.author.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.timeline(), [kept])
+        self.assertEqual(self.feed(), [kept])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_popular_author_read_from_recipes(self):
+        fan = APIClient()
+        fan.force_authenticate(create_user('fan'))
+        self.subscribe(self.author, fan)
+        self.subscribe(self.author)
+        regular = create_user('regular')
+        old = create_recipe(self.author, 'Борщ').id
+        self.subscribe(regular)
+        own = create_recipe(regular, 'Щи')
+        TimelineEntry.objects.fan_out([own])
+        new = create_recipe(self.author, 'Рагу').id
+        self.assertEqual(self.timeline(), [own.id])
+        self.assertEqual(self.feed(), [new, own.id, old])
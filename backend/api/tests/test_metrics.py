@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+
+REQUEST_SCRIPT = '''
+import django
+django.setup()
+from django.test import Client
+assert Client(HTTP_HOST='localhost').get('/api/tags/').status_code == 200
+'''
+SCRAPE_SCRIPT = '''
+import django
+django.setup()
+from django.test import Client
+print(Client(HTTP_HOST='localhost').get('/metrics').content.decode())
+'''
+
+
+class MetricsTests(TestCase):
+    """Запросы попадают в метрики Prometheus по маршрутам."""
+
+    def test_request_is_counted(self):
+        self.client.get('/api/tags/')
+        content = self.client.get('/metrics').content.decode()
+        self.assertIn('foodgram_request_duration_seconds_bucket{', content)
+        self.assertIn('view="tags-list"', content)
+        self.assertIn('foodgram_db_queries_total{alias="default"}', content)
+        self.assertIn('foodgram_recipe_fragments_total{result="hits"}',
+                      content)
+
+
+class MultiprocessMetricsTests(SimpleTestCase):
+    """Адрес /metrics суммирует значения всех процессов."""
+
+    def run_python(self, script, env):
+        result = subprocess.run(
+            (sys.executable, '-c', script), env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=60, check=True
+        )
+        return result.stdout
+
+    def test_workers_are_summed(self):
+        with tempfile.TemporaryDirectory() as path:
+            env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': path,
+                   'DJANGO_SETTINGS_MODULE': 'foodgram.settings',
+                   'DB_ENGINE': 'django.db.backends.sqlite3',
+                   'DB_NAME': os.path.join(path, 'db.sqlite3')}
+            self.run_python('import django; django.setup(); '
+                            'from django.core.management import '
+                            'call_command; call_command("migrate", '
+                            'verbosity=0)', env)
+            for _ in range(2):
+                self.run_python(REQUEST_SCRIPT, env)
+            content = self.run_python(SCRAPE_SCRIPT, env)
+        self.assertIn(
+            'foodgram_requests_total{method="GET",status="200",'
+            'view="tags-list"} 2.0', content
+        )
@@ -0,0 +1,91 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from app.models import IngredientsAmount, ShoppingCart, ShoppingListItem
+
+from .utils import create_ingredient, create_recipe, create_tag, create_user
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class RecipeIngredientsUpdateTests(TestCase):
+    """Изменение рецепта меняет только отличающиеся ингредиенты."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.tag = create_tag('lunch')
+        self.flour = create_ingredient('мука')
+        self.sugar = create_ingredient('сахар')
+        self.milk = create_ingredient('молоко', 'мл')
+        self.recipe = create_recipe(self.author, 'Блины', [self.tag],
+                                    [self.flour, self.sugar])
+        self.buyer = create_user('buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+
+    def patch(self, amounts):
+        response = self.author_client.patch(
+            f'/api/recipes/{self.recipe.id}/', {
+                'name': 'Блины', 'text': 'Описание', 'cooking_time': 10,
+                'tags': [self.tag.id],
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': amount}
+                    for ingredient, amount in amounts
+                ],
+            }, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def amounts(self):
+        return dict(IngredientsAmount.objects.filter(
+            recipe=self.recipe
+        ).values_list('ingredient__name', 'amount'))
+
+    def shopping_list(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.buyer
+        ).values_list('ingredient__name', 'total_amount'))
+
+    def fragment_ingredients(self):
+        data = self.client.get(f'/api/recipes/{self.recipe.id}/').json()
+        return {ingredient['name']: ingredient['amount']
+                for ingredient in data['ingredients']}
+
+    def test_add_remove_and_change(self):
+        self.assertEqual(self.fragment_ingredients(),
+                         {'мука': 100, 'сахар': 100})
+        self.patch([(self.flour, 250), (self.milk, 500)])
+        expected = {'мука': 250, 'молоко': 500}
+        self.assertEqual(self.amounts(), expected)
+        self.assertEqual(self.shopping_list(), expected)
+        self.assertEqual(self.fragment_ingredients(), expected)
+
+    def test_unchanged_ingredients_write_nothing(self):
+        amounts = IngredientsAmount.objects.filter(recipe=self.recipe)
+        ids = set(amounts.values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as context:
+            self.patch([(self.flour, 100), (self.sugar, 100)])
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith(WRITES)
+            and ('"app_ingredientsamount"' in query['sql']
+                 or '"app_shoppinglistitem"' in query['sql'])
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(set(amounts.values_list('id', flat=True)), ids)
+        self.assertEqual(self.shopping_list(), {'мука': 100, 'сахар': 100})
+
+    def test_shopping_list_of_other_recipes_kept(self):
+        other = create_recipe(self.author, 'Пирог', [self.tag], [self.flour])
+        ShoppingCart.objects.create(user=self.buyer, recipe=other)
+        ShoppingListItem.objects.refresh_recipe(other, users=[self.buyer.id])
+        self.patch([(self.flour, 250)])
+        self.assertEqual(self.shopping_list(), {'мука': 350})
@@ -0,0 +1,99 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from app.models import Favorite, ShoppingCart
+from users.models import Follow
+
+from .utils import create_ingredient, create_recipe, create_tag, create_user
+
+
+class RecipeReadTests(TestCase):
+    """Список и карточка рецепта собираются из аннотированного запроса."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('reader')
+        self.author = create_user('author')
+        self.tag = create_tag('lunch')
+        self.ingredient = create_ingredient('мука')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_recipes(self, count):
+        return [create_recipe(self.author, f'Рецепт {i}', [self.tag],
+                              [self.ingredient])
+                for i in range(count)]
+
+    def list_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/?limit=50')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_list_has_user_flags(self):
+        favorite, cart, other = self.add_recipes(3)
+        Favorite.objects.create(user=self.user, recipe=favorite)
+        ShoppingCart.objects.create(user=self.user, recipe=cart)
+        Follow.objects.create(user=self.user, author=self.author)
+        results = {
+            item['id']: item
+            for item in self.client.get('/api/recipes/').json()['results']
+        }
+        self.assertTrue(results[favorite.id]['is_favorited'])
+        self.assertFalse(results[favorite.id]['is_in_shopping_cart'])
+        self.assertTrue(results[cart.id]['is_in_shopping_cart'])
+        self.assertFalse(results[other.id]['is_favorited'])
+        self.assertTrue(results[other.id]['author']['is_subscribed'])
+
+    def test_list_queries_do_not_grow_with_page(self):
+        self.add_recipes(2)
+        few = self.list_queries()
+        self.add_recipes(8)
+        self.assertEqual(self.list_queries(), few)
+
+    def test_detail_has_user_flags(self):
+        recipe, = self.add_recipes(1)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        data = self.client.get(f'/api/recipes/{recipe.id}/').json()
+        self.assertTrue(data['is_in_shopping_cart'])
+        self.assertFalse(data['is_favorited'])
+        self.assertEqual(data['ingredients'][0]['name'], 'мука')
+
+    def test_list_uses_subscription_annotation(self):
+        self.add_recipes(2)
+        self.client.get('/api/recipes/')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT "users_follow"."author_id"')
+            for query in context.captured_queries
+        ))
+
+
+class CounterSaveTests(TestCase):
+    """Сохранение не перезаписывает счетчики и уважает update_fields."""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.recipe = create_recipe(self.author, 'Борщ')
+
+    def updates(self, instance, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            instance.save(**kwargs)
+        return [query['sql'] for query in context.captured_queries
+                if query['sql'].startswith('UPDATE')]
+
+    def test_empty_update_fields_saves_nothing(self):
+        self.assertEqual(self.updates(self.recipe, update_fields=[]), [])
+        self.assertEqual(self.updates(self.author, update_fields=[]), [])
+
+    def test_save_skips_counters(self):
+        update, = self.updates(self.recipe)
+        self.assertNotIn('favorites_count', update)
+        update, = self.updates(self.author)
+        self.assertNotIn('recipes_count', update)
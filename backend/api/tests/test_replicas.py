@@ -0,0 +1,86 @@
+from unittest import mock
+
+from django.db import connections
+from django.test import RequestFactory, TransactionTestCase
+from django.utils.connection import ConnectionDoesNotExist
+from rest_framework.test import APIClient
+
+from api.replicas import (ReplicaMiddleware, read_primary, sticky_key,
+                          use_replica)
+from api.search import IngredientIndex
+from api.serializers import RecipeListSerializer
+from app.models import Recipe
+
+from .utils import create_ingredient, create_recipe, create_tag, create_user
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Реплика подменена несуществующей базой: любое чтение из нее падает,
+    поэтому успешное заполнение кэша значит, что оно шло в основную базу.
+    """
+
+    def setUp(self):
+        author = create_user('author')
+        self.recipe = create_recipe(author, 'Борщ', [create_tag('lunch')],
+                                    [create_ingredient('свекла')])
+        patcher = mock.patch('api.replicas.connections',
+                             {'default': connections['default'],
+                              'replica': connections['default']})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token = use_replica.set(True)
+        self.addCleanup(use_replica.reset, token)
+
+    def test_reads_go_to_replica(self):
+        with self.assertRaises(ConnectionDoesNotExist):
+            Recipe.objects.count()
+
+    def test_read_primary(self):
+        with read_primary():
+            self.assertEqual(Recipe.objects.count(), 1)
+        with self.assertRaises(ConnectionDoesNotExist):
+            Recipe.objects.count()
+
+    def test_cache_fills_read_primary(self):
+        fragments = RecipeListSerializer.build_fragments([self.recipe.id])
+        self.assertEqual(fragments[self.recipe.id]['name'], 'Борщ')
+        self.assertEqual(len(IngredientIndex().build()[0]), 1)
+
+    def test_cached_reference_list_reads_primary(self):
+        response = APIClient().get('/api/tags/')
+        self.assertEqual(response.json()[0]['slug'], 'lunch')
+
+
+class StickyKeyTests(TransactionTestCase):
+    """После записи закрепляется только клиент с токеном или сессией."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        patcher = mock.patch('api.replicas.connections',
+                             {'replica': connections['default']})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, **extra):
+        request = self.factory.post('/api/recipes/', **extra)
+        ReplicaMiddleware.remember_write(request, mock.Mock(status_code=201))
+
+    def can_read_replica(self, **extra):
+        return ReplicaMiddleware.can_use_replica(
+            self.factory.get('/api/recipes/', **extra)
+        )
+
+    def test_anonymous_clients_are_not_pinned(self):
+        self.assertIsNone(sticky_key(self.factory.get('/')))
+        self.write(REMOTE_ADDR='10.0.0.1')
+        self.assertTrue(self.can_read_replica(REMOTE_ADDR='10.0.0.1'))
+
+    def test_token_client_is_pinned(self):
+        self.write(HTTP_AUTHORIZATION='Token first')
+        self.assertFalse(self.can_read_replica(
+            HTTP_AUTHORIZATION='Token first'
+        ))
+        self.assertTrue(self.can_read_replica(
+            HTTP_AUTHORIZATION='Token second'
+        ))
@@ -0,0 +1,103 @@
+import csv
+import io
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.renderers import CsvShoppingListRenderer
+from app.models import ShoppingCart, ShoppingListItem
+
+from .utils import create_ingredient, create_recipe, create_user
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingListDownloadTests(TestCase):
+    """Выгрузка списка покупок в txt, csv и pdf."""
+
+    def setUp(self):
+        self.user = create_user('buyer')
+        self.token = Token.objects.create(user=self.user)
+        flour = create_ingredient('мука')
+        sugar = create_ingredient('сахар')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for name in ('Блины', 'Пирог'):
+            recipe = create_recipe(self.user, name, ingredients=[flour, sugar])
+            response = self.client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            )
+            self.assertEqual(response.status_code, 201)
+
+    def download(self, fmt):
+        response = self.client.get(URL, {'format': fmt})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'.{fmt}', response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def test_txt(self):
+        content = self.download('txt').decode()
+        self.assertIn('buyer', content)
+        self.assertIn('мука - 200, г', content)
+        self.assertIn('сахар - 200, г', content)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.download('csv').decode())))
+        self.assertEqual(rows[1:], [['мука', '200', 'г'],
+                                    ['сахар', '200', 'г']])
+
+    def test_pdf(self):
+        self.assertTrue(self.download('pdf').startswith(b'%PDF'))
+
+    @override_settings(SHOPPING_LIST_STREAMING=False)
+    async def test_asgi_builds_whole_file(self):
+        response = await self.async_client.get(
+            URL, {'format': 'pdf'},
+            authorization=f'Token {self.token.key}'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('.pdf', response['Content-Disposition'])
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_errors_are_json(self):
+        response = APIClient().get(URL, {'format': 'pdf'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', response.json())
+
+    def test_render_matches_stream(self):
+        request = APIRequestFactory().get(URL)
+        request.user = self.user
+        rows = [{'ingredients': 'мука', 'amount': 200, 'measure': 'г'}]
+        renderer = CsvShoppingListRenderer()
+        self.assertEqual(
+            renderer.render(rows, renderer_context={'request': request}),
+            ''.join(renderer.stream(self.user, rows)).encode()
+        )
+
+
+class ShoppingListRefreshTests(TestCase):
+    """Суммы пересчитываются под блокировкой строк пользователей."""
+
+    def setUp(self):
+        self.user = create_user('buyer')
+        self.flour = create_ingredient('мука')
+        recipe = create_recipe(self.user, 'Блины', ingredients=[self.flour])
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def test_users_locked_before_totals(self):
+        with CaptureQueriesContext(connection) as context:
+            ShoppingListItem.objects.refresh([self.user.id], [self.flour.id])
+        queries = [query['sql'] for query in context.captured_queries]
+        lock = next(i for i, sql in enumerate(queries)
+                    if 'FROM "users_customuser"' in sql)
+        totals = next(i for i, sql in enumerate(queries) if 'SUM(' in sql)
+        self.assertLess(lock, totals)
+        self.assertEqual(
+            ShoppingListItem.objects.get(user=self.user).total_amount, 100
+        )
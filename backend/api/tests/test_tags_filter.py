@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.search import tag_bits
+from app.models import Recipe
+
+from .utils import create_recipe, create_tag, create_user
+
+
+class TagFilterTests(TestCase):
+    """Фильтр по маске тегов совпадает с фильтром по связи с тегами."""
+
+    def setUp(self):
+        cache.clear()
+        tag_bits.invalidate()
+        self.author = create_user('author')
+        self.lunch = create_tag('lunch')
+        self.dinner = create_tag('dinner')
+        self.client = APIClient()
+
+    def filtered_ids(self, query):
+        response = self.client.get(f'/api/recipes/?limit=50&{query}')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def create_tag_elsewhere(self, slug):
+        """Тег, созданный другим процессом: локальный сброс не приходит."""
+        tag_bits.get()
+        with mock.patch.object(tag_bits, 'invalidate'):
+            return create_tag(slug)
+
+    def test_matches_tags_relation(self):
+        recipes = [create_recipe(self.author, 'Суп', [self.lunch]),
+                   create_recipe(self.author, 'Рагу', [self.dinner]),
+                   create_recipe(self.author, 'Каша',
+                                 [self.lunch, self.dinner]),
+                   create_recipe(self.author, 'Чай')]
+        any_tag = {recipe.id for recipe in recipes[:3]}
+        self.assertEqual(
+            self.filtered_ids('tags=lunch&tags=dinner'), any_tag
+        )
+        self.assertEqual(
+            self.filtered_ids('tags=lunch&tags=dinner&tags_match=all'),
+            set(Recipe.objects.filter(tags=self.lunch)
+                .filter(tags=self.dinner).values_list('id', flat=True))
+        )
+        self.assertEqual(
+            self.filtered_ids('tags=lunch'),
+            set(Recipe.objects.filter(tags=self.lunch)
+                .values_list('id', flat=True))
+        )
+
+    def test_bit_assigned_in_other_process(self):
+        brunch = self.create_tag_elsewhere('brunch')
+        recipe = create_recipe(self.author, 'Омлет', [self.lunch, brunch])
+        self.assertEqual(self.filtered_ids('tags=lunch'), {recipe.id})
+        self.assertEqual(self.filtered_ids('tags=brunch'), {recipe.id})
+        self.assertEqual(
+            self.filtered_ids('tags=lunch&tags=brunch&tags_match=all'),
+            {recipe.id}
+        )
@@ -0,0 +1,43 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from users.models import Follow
+
+from .utils import create_recipe, create_user
+
+
+class SubscribeTests(TestCase):
+    """Подписка возвращает автора с рецептами, отписка их не собирает."""
+
+    def setUp(self):
+        self.user = create_user('follower')
+        self.author = create_user('author')
+        create_recipe(self.author, 'Рецепт')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/users/{self.author.id}/subscribe/'
+
+    def test_subscribe_and_unsubscribe(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['recipes_count'], 1)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+        self.assertFalse([query for query in context.captured_queries
+                          if 'FROM "app_recipe"' in query['sql']])
+
+    def test_unsubscribe_without_subscription(self):
+        self.assertEqual(self.client.delete(self.url).status_code, 400)
+
+    def test_unsubscribe_from_missing_author(self):
+        response = self.client.delete('/api/users/999999/subscribe/')
+        self.assertEqual(response.status_code, 404)
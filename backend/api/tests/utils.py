@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+
+from app.models import (Ingredient, IngredientsAmount, Recipe, Tag,
+                        change_counter)
+
+User = get_user_model()
+
+
+def create_user(username, **kwargs):
+    return User.objects.create_user(
+        username=username, email=f'{username}@foodgram.ru',
+        first_name='Имя', last_name='Фамилия', password='Secret-pass-123',
+        **kwargs
+    )
+
+
+def create_tag(slug):
+    return Tag.objects.create(name=slug, slug=slug,
+                              color=f'#{Tag.objects.count():06d}')
+
+
+def create_ingredient(name, unit='г'):
+    return Ingredient.objects.create(name=name, measurement_unit=unit)
+
+
+def create_recipe(author, name, tags=(), ingredients=()):
+    """Рецепт так же, как его сохраняет API: с маской тегов и счетчиком."""
+    recipe = Recipe.objects.create(author=author, name=name, text='Описание',
+                                   cooking_time=10,
+                                   tags_mask=Tag.mask(tags))
+    recipe.tags.set(tags)
+    IngredientsAmount.objects.bulk_create(
+        IngredientsAmount(recipe=recipe, ingredient=ingredient, amount=100)
+        for ingredient in ingredients
+    )
+    change_counter(User.objects.filter(pk=author.pk), 'recipes_count', 1)
+    return recipe
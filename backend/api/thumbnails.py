@@ -0,0 +1,60 @@
+import os
+from io import BytesIO
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+THUMBNAILS_DIR = 'thumbs'
+THUMBNAIL_FORMAT = 'JPEG'
+THUMBNAIL_EXTENSION = '.jpg'
+THUMBNAIL_QUALITY = 85
+THUMBNAIL_MAX_AGE = 60 * 60 * 24 * 365
+
+RENDITIONS = {
+    'small': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+
+
+def thumbnail_name(name, rendition):
+    return os.path.join(THUMBNAILS_DIR, rendition, name + THUMBNAIL_EXTENSION)
+
+
+def make_thumbnail(name, rendition):
+    """Создает уменьшенную копию картинки, если ее еще нет на диске."""
+    target = thumbnail_name(name, rendition)
+    if default_storage.exists(target):
+        return target
+    with default_storage.open(name) as f:
+        image = ImageOps.exif_transpose(Image.open(f))
+        image.thumbnail(RENDITIONS[rendition])
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY,
+                   optimize=True, progressive=True)
+    return default_storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def thumbnail(request, rendition, name):
+    """
+    Отдает уменьшенную копию картинки, создавая ее при первом запросе.
+    Следующие запросы nginx обслуживает с диска сам.
+    """
+    if (rendition not in RENDITIONS
+            or not name.endswith(THUMBNAIL_EXTENSION)
+            or name.startswith(THUMBNAILS_DIR + '/')):
+        raise Http404
+    try:
+        target = make_thumbnail(name[:-len(THUMBNAIL_EXTENSION)], rendition)
+    except (FileNotFoundError, SuspiciousFileOperation,
+            UnidentifiedImageError, Image.DecompressionBombError):
+        raise Http404
+    response = FileResponse(default_storage.open(target),
+                            content_type='image/jpeg')
+    response['Cache-Control'] = f'public, max-age={THUMBNAIL_MAX_AGE}'
+    return response
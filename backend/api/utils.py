@@ -1,7 +1,12 @@
 from base64 import b64decode
 
 from django.core.files.base import ContentFile
-from rest_framework.serializers import ImageField
+from django.core.files.storage import default_storage
+from rest_framework.serializers import ImageField, ReadOnlyField
+
+from users.models import Follow
+
+from .thumbnails import RENDITIONS, thumbnail_name
 
 
 class Base64ImageField(ImageField):
@@ -12,3 +17,37 @@ class Base64ImageField(ImageField):
             ext = format.split('/')[-1]
             data = ContentFile(b64decode(imgstr), name='photo.' + ext)
         return super().to_internal_value(data)
+
+
+class ThumbnailsField(ReadOnlyField):
+    """
+    Адреса уменьшенных копий картинки.
+    Сами копии создаются при первом обращении к адресу.
+    """
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        thumbnails = {}
+        for rendition in RENDITIONS:
+            url = default_storage.url(thumbnail_name(value.name, rendition))
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            thumbnails[rendition] = url
+        return thumbnails
+
+
+def get_subscriptions(request):
+    """
+    Множество id авторов, на которых подписан пользователь запроса.
+    Загружается одним запросом и хранится в объекте запроса.
+    """
+    if request is None or request.user.is_anonymous:
+        return frozenset()
+    subscriptions = getattr(request, '_subscriptions', None)
+    if subscriptions is None:
+        subscriptions = set(Follow.objects.filter(
+            user=request.user
+        ).values_list('author_id', flat=True))
+        request._subscriptions = subscriptions
+    return subscriptions
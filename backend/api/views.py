@@ -1,7 +1,9 @@
-from datetime import datetime
+from itertools import chain
 
-from django.db.models import F, Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Prefetch, Q, Subquery
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -10,20 +12,33 @@ from rest_framework.decorators import action
 from rest_framework.permissions import (SAFE_METHODS, AllowAny,
                                         IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from app.models import Ingredient, IngredientsAmount, Recipe, Tag
+from app.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                        ShoppingListItem, Tag, TimelineEntry, change_counter)
 from users.models import CustomUser, Follow
 
 from .filters import IngredientFilter, RecipeFilter
-from .paginations import LimitPagination
+from .mixins import CachedReadMixin
+from .paginations import (FeedCursorPagination, LimitPagination,
+                          RecipePagination)
 from .permissions import AuthorStaffOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS
+from .search import ingredient_index, recipe_ingredient_index
 from .serializers import (CustomUserSerializer, FavoriteRecipeSerializer,
                           FollowSerializer, IngredientSerializer,
                           RecipeCreateUpdateSerializer, RecipeListSerializer,
+                          RecipesByIngredientsSerializer,
                           ShoppingCartSerializer, TagSerializer)
 
+SHOPPING_LIST_CHUNK_SIZE = 500
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'shopcarts_count',
+}
+
 
 class UsersViewSet(UserViewSet):
     """
@@ -36,6 +51,26 @@ class UsersViewSet(UserViewSet):
     permission_classes = [AllowAny]
     add_serializer = FollowSerializer
 
+    def get_authors(self, queryset):
+        """
+        Подготавливает авторов для FollowSerializer.
+        Кол-во рецептов хранится в счетчике, а последние recipes_limit
+        рецептов каждого автора подгружаются одним запросом.
+        """
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pub_date', '-id').values('pk')[
+                    :int(recipes_limit)
+                ]
+            ))
+        return queryset.order_by('id').prefetch_related(
+            Prefetch('recipes', queryset=recipes)
+        )
+
     @action(methods=['GET'], detail=False,
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
@@ -44,7 +79,9 @@ class UsersViewSet(UserViewSet):
         Доступ для авторизванных.
         """
         user = self.request.user
-        authors = CustomUser.objects.filter(followings__user=user)
+        authors = self.get_authors(
+            CustomUser.objects.filter(followings__user=user)
+        )
         page = self.paginate_queryset(authors)
         serializer = FollowSerializer(
             page, many=True, context={'request': request}
@@ -53,13 +90,17 @@ class UsersViewSet(UserViewSet):
 
     @action(methods=['POST', 'DELETE'], detail=True,
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def subscribe(self, request, id):
         """
         Для методов post, delete подписывается/отписывается от автора.
         Доступ для авторизованных.
         """
         user = self.request.user
-        author = get_object_or_404(CustomUser, id=id)
+        authors = CustomUser.objects.all()
+        if request.method == 'POST':
+            authors = self.get_authors(authors)
+        author = get_object_or_404(authors, id=id)
         subscription = Follow.objects.filter(user=user, author=author)
 
         if request.method == 'POST':
@@ -70,6 +111,9 @@ class UsersViewSet(UserViewSet):
                 )
             serializer = FollowSerializer(author, context={'request': request})
             Follow.objects.create(user=user, author=author)
+            change_counter(CustomUser.objects.filter(pk=author.pk),
+                           'followers_count', 1)
+            TimelineEntry.objects.backfill(user, author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
@@ -78,23 +122,28 @@ class UsersViewSet(UserViewSet):
                     {'error': 'Вы не подписаны на этого пользователя'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-        subscription.delete()
+        deleted, _ = subscription.delete()
+        change_counter(CustomUser.objects.filter(pk=author.pk),
+                       'followers_count', -deleted)
+        TimelineEntry.objects.prune(user, author)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CachedReadMixin, ReadOnlyModelViewSet):
     """Вьюсет для получения тегов."""
+    cache_models = (Tag,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = None
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CachedReadMixin, ReadOnlyModelViewSet):
     """
     Вьюсет для получения ингердиентов.
     Поиск по названию.
     """
+    cache_models = (Ingredient,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
@@ -103,6 +152,23 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     search_fields = ('^name',)
     pagination_class = None
 
+    def filter_queryset(self, queryset):
+        """
+        Поиск по названию обслуживается индексом в памяти без запросов
+        к базе, нечеткий поиск (fuzzy) и большие справочники - базой.
+        limit ограничивает кол-во подсказок.
+        """
+        if self.action != 'list':
+            return super().filter_queryset(queryset)
+        params = self.request.query_params
+        name = params.get('name')
+        fuzzy = params.get('fuzzy') in ('1', 'true', 'True')
+        limit = params.get('limit')
+        limit = int(limit) if limit and limit.isdigit() else None
+        if name and settings.INGREDIENT_INDEX_ENABLED and not fuzzy:
+            return ingredient_index.search(name, limit=limit)
+        return super().filter_queryset(queryset)[:limit]
+
 
 class RecipeViewSet(ModelViewSet):
     """
@@ -114,23 +180,50 @@ class RecipeViewSet(ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = [AuthorStaffOrReadOnly]
-    pagination_class = LimitPagination
+    pagination_class = RecipePagination
     http_method_names = ['get', 'post', 'patch', 'delete']
 
+    def get_queryset(self):
+        queryset = Recipe.objects.all()
+        if self.request.method in SAFE_METHODS:
+            return queryset.with_user_flags(self.request.user)
+        return queryset
+
     def get_serializer_class(self):
-        if self.action in SAFE_METHODS:
+        if self.request.method in SAFE_METHODS:
             return RecipeListSerializer
         return RecipeCreateUpdateSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Ошибки выгрузки списка покупок отдаются как JSON."""
+        if (self.action == 'download_shopping_cart'
+                and isinstance(response, Response)
+                and response.status_code != status.HTTP_200_OK):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        users = list(instance.shopcarts.values_list('user', flat=True))
+        ingredients = list(
+            instance.amounts.values_list('ingredient', flat=True)
+        )
+        instance.delete()
+        change_counter(CustomUser.objects.filter(pk=instance.author_id),
+                       'recipes_count', -1)
+        ShoppingListItem.objects.refresh(users, ingredients)
+
+    @transaction.atomic
     def action_post_delete(self, pk, serializer_class):
         user = self.request.user
         recipe = get_object_or_404(Recipe, pk=pk)
-        model_obj = serializer_class.Meta.model.objects.filter(
-            user=user, recipe=recipe
-        )
+        model = serializer_class.Meta.model
+        model_obj = model.objects.filter(user=user, recipe=recipe)
+        counter = Recipe.objects.filter(pk=recipe.pk)
 
         if self.request.method == 'POST':
             serializer = serializer_class(
@@ -139,15 +232,24 @@ class RecipeViewSet(ModelViewSet):
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            change_counter(counter, RECIPE_COUNTERS[model], 1)
+            self.refresh_shopping_list(recipe, user, serializer_class)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if self.request.method == 'DELETE':
             if not model_obj.exists():
                 return Response({'error': 'Этого рецепта нет в избранном.'},
                                 status=status.HTTP_400_BAD_REQUEST)
-        model_obj.delete()
+        deleted, _ = model_obj.delete()
+        change_counter(counter, RECIPE_COUNTERS[model], -deleted)
+        self.refresh_shopping_list(recipe, user, serializer_class)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def refresh_shopping_list(recipe, user, serializer_class):
+        if serializer_class.Meta.model is ShoppingCart:
+            ShoppingListItem.objects.refresh_recipe(recipe, users=[user.id])
+
     @action(methods=['POST', 'DELETE'], detail=True,
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
@@ -159,31 +261,119 @@ class RecipeViewSet(ModelViewSet):
         return self.action_post_delete(pk, ShoppingCartSerializer)
 
     @action(methods=['GET'], detail=False,
-            permission_classes=[IsAuthenticated], pagination_class=None)
+            pagination_class=LimitPagination)
+    def trending(self, request):
+        """
+        Популярные за последнее время рецепты.
+        Популярность заранее посчитана командой refresh_trending,
+        фильтры по тегам и автору работают как в списке рецептов.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            trending__isnull=False
+        ).order_by('-trending__score', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['GET'], detail=False, url_path='by-ingredients',
+            pagination_class=None)
+    def by_ingredients(self, request):
+        """
+        Что приготовить из имеющихся ингредиентов.
+        Рецепты подбираются по обратному индексу в памяти: первыми идут
+        те, где не хватает меньше всего ингредиентов. К каждому рецепту
+        добавляется число имеющихся и недостающих ингредиентов.
+        """
+        params = RecipesByIngredientsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        counts = {
+            recipe_id: (matched, missing)
+            for recipe_id, matched, missing in recipe_ingredient_index.search(
+                params.validated_data['ingredients'],
+                params.validated_data['limit']
+            )
+        }
+        recipes = self.get_queryset().in_bulk(counts)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in counts if pk in recipes], many=True
+        )
+        data = serializer.data
+        for item in data:
+            item['matched_ingredients'], item['missing_ingredients'] = (
+                counts[item['id']]
+            )
+        return Response(data)
+
+    @action(methods=['GET'], detail=False,
+            permission_classes=[IsAuthenticated],
+            pagination_class=FeedCursorPagination)
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь.
+        Страница читается из TimelineEntry по индексу ленты. Рецепты
+        авторов с очень большим числом подписчиков в ленты не
+        раскладываются и добавляются к ленте при чтении.
+        """
+        user = request.user
+        queryset = self.get_queryset()
+        popular_authors = list(CustomUser.objects.filter(
+            followings__user=user,
+            followers_count__gt=settings.FEED_FANOUT_LIMIT
+        ).values_list('pk', flat=True))
+        if popular_authors:
+            queryset = queryset.filter(
+                Q(pk__in=TimelineEntry.objects.filter(user=user).values(
+                    'recipe'
+                )) | Q(author__in=popular_authors)
+            ).annotate(feed_date=F('pub_date'), feed_recipe=F('pk'))
+        else:
+            queryset = queryset.filter(timeline_entries__user=user).annotate(
+                feed_date=F('timeline_entries__pub_date'),
+                feed_recipe=F('timeline_entries__recipe')
+            )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['GET'], detail=False,
+            permission_classes=[IsAuthenticated], pagination_class=None,
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
         """
-        Ф-я по добавлению рецептов в список покупок.
+        Ф-я по выгрузке списка покупок в формате txt, csv или pdf.
+        Файл отдается потоком по мере чтения ингредиентов из базы.
+        Без SHOPPING_LIST_STREAMING (под ASGI) файл собирается рендерером
+        целиком в потоке запроса: Django 4.1 читает поток ответа в цикле
+        событий, где запросы к базе запрещены.
         Доступ для авторизованных.
         """
         user = request.user
-        if not user.shopcarts.exists():
+        ingredients = ShoppingListItem.objects.filter(user=user).values(
+            ingredients=F('ingredient__name'),
+            measure=F('ingredient__measurement_unit'),
+            amount=F('total_amount')
+        ).order_by('ingredients')
+        renderer = request.accepted_renderer
+        filename = f'{user.username}_shopping_list.{renderer.format}'
+        headers = {'Content-Disposition': f'attachment; filename={filename}'}
+        if not settings.SHOPPING_LIST_STREAMING:
+            ingredients = list(ingredients)
+            if not ingredients:
+                return Response({'error': 'Список покупок пуст'},
+                                status=status.HTTP_204_NO_CONTENT)
+            return Response(ingredients, headers=headers)
+
+        ingredients = ingredients.iterator(
+            chunk_size=SHOPPING_LIST_CHUNK_SIZE
+        )
+        first = next(ingredients, None)
+        if first is None:
             return Response({'error': 'Список покупок пуст'},
                             status=status.HTTP_204_NO_CONTENT)
-        ingredients = IngredientsAmount.objects.filter(
-            recipe__shopcarts__user=user
-        ).values(
-            ingredients=F('ingredient__name'),
-            measure=F('ingredient__measurement_unit')
-        ).annotate(amount=Sum('amount'))
-
-        filename = f'{user.username}_shopping_list.txt'
-        shopping_list = (f'Список покупок\n\n{user.username}\n'
-                         f'{datetime.now().strftime("%d/%m/%Y %H:%M")}\n\n')
-        for ing in ingredients:
-            shopping_list += (
-                f'{ing["ingredients"]} - {ing["amount"]}, {ing["measure"]}\n'
-            )
-        response = HttpResponse(shopping_list,
-                                content_type='text.txt; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
-        return response
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        return StreamingHttpResponse(
+            renderer.stream(user, chain((first,), ingredients)),
+            content_type=content_type, headers=headers
+        )
@@ -16,29 +16,30 @@ class IngredientsAmountInline(TabularInline):
 class RecipeAdmin(ModelAdmin):
     """
     Кастомное отображение модели Recipe в админке.
-    Выводит в карточке рецепта кол-во добавления в избранное и список покупок.
+    Выводит в карточке рецепта кол-во добавления в избранное и список покупок
+    из счетчиков рецепта.
     В списке рецептов добавлено поле с тегами.
+    После сохранения тегов пересчитывается маска тегов рецепта.
     """
-    list_display = ('name', 'author', 'display_tags')
+    list_display = ('name', 'author', 'display_tags', 'favorites_count',
+                    'shopcarts_count')
     list_filter = ('name', 'author', 'tags')
     search_fields = ('name', 'author__username', 'author__last_name',
                      'author__first_name', 'tags__name')
-    readonly_fields = ('favorite_count', 'shopping_count')
+    readonly_fields = ('favorites_count', 'shopcarts_count')
     filter_vertical = ('tags', 'ingredients')
     inlines = (IngredientsAmountInline,)
     empty_value_display = '--пусто--'
 
-    def favorite_count(self, obj):
-        return obj.favorites.count()
-
-    def shopping_count(self, obj):
-        return obj.shopcarts.count()
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        recipe = form.instance
+        recipe.tags_mask = Tag.mask(recipe.tags.all())
+        Recipe.objects.filter(pk=recipe.pk).update(tags_mask=recipe.tags_mask)
 
     def display_tags(self, obj):
         return ', '.join([tag.name for tag in obj.tags.all()])
 
-    favorite_count.short_description = 'В избранном'
-    shopping_count.short_description = 'В списке покупок'
     display_tags.short_description = 'Теги'
 
 
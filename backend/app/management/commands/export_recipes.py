@@ -0,0 +1,58 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from app.models import Recipe
+
+CHUNK_SIZE = 500
+
+
+def recipe_record(recipe):
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': recipe.image.name,
+        'author': {'email': recipe.author.email,
+                   'username': recipe.author.username},
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [
+            {'name': amount.ingredient.name,
+             'measurement_unit': amount.ingredient.measurement_unit,
+             'amount': amount.amount}
+            for amount in recipe.amounts.all()
+        ],
+    }
+
+
+class Command(BaseCommand):
+    """
+    Выгружаем рецепты в формате JSON Lines: одна строка - один рецепт.
+    Рецепты читаются из базы порциями, память не растет с их кол-вом.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', default='-', nargs='?', type=str,
+                            help='Файл для выгрузки, по умолчанию stdout.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'amounts__ingredient'
+        ).order_by('id').iterator(chunk_size=CHUNK_SIZE)
+        filename = options['filename']
+        f = (sys.stdout if filename == '-'
+             else open(filename, 'w', encoding='utf-8'))
+        total = 0
+        try:
+            for recipe in recipes:
+                f.write(json.dumps(recipe_record(recipe), ensure_ascii=False))
+                f.write('\n')
+                total += 1
+        finally:
+            if f is not sys.stdout:
+                f.close()
+        self.stderr.write(self.style.SUCCESS(
+            f'=== Выгружено рецептов: {total} ==='
+        ))
@@ -0,0 +1,140 @@
+import json
+from collections import Counter, defaultdict
+from datetime import datetime
+from itertools import islice
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.models import (Ingredient, IngredientsAmount, Recipe, Tag,
+                        TimelineEntry, change_counter)
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    """
+    Загружаем рецепты из файла JSON Lines, созданного export_recipes.
+    Файл читается построчно, рецепты сохраняются порциями, каждая порция
+    в своей транзакции. Рецепты неизвестных авторов пропускаются,
+    рецепт с неизвестным тегом останавливает загрузку.
+    Рецепт с тем же автором, названием и датой публикации уже загружен
+    и тоже пропускается, так что прерванную загрузку можно повторить.
+    """
+    help = ('Загружает рецепты из файла JSON Lines. Повторный запуск '
+            'безопасен: уже загруженные рецепты (тот же автор, название '
+            'и дата публикации) пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', type=str)
+        parser.add_argument('--batch-size', default=BATCH_SIZE, type=int)
+
+    def handle(self, *args, **options):
+        started = monotonic()
+        self.tags = {tag.slug: tag for tag in Tag.objects.all()}
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        imported = skipped = 0
+        try:
+            with open(options['filename'], 'r', encoding='utf-8') as f:
+                records = (json.loads(line) for line in f if line.strip())
+                while batch := list(islice(records, options['batch_size'])):
+                    saved = self.import_batch(batch)
+                    imported += saved
+                    skipped += len(batch) - saved
+        except FileNotFoundError:
+            raise CommandError(f'Файл {options["filename"]} не найден')
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Загружено рецептов: {imported}, пропущено: {skipped} '
+            f'({monotonic() - started:.2f} с) ==='
+        ))
+
+    @staticmethod
+    def new_records(batch, authors):
+        """Записи известных авторов, которых еще нет в базе."""
+        batch = [
+            {**record, 'author_id': authors[record['author']['email']],
+             'pub_date': datetime.fromisoformat(record['pub_date'])}
+            for record in batch if record['author']['email'] in authors
+        ]
+        seen = set(Recipe.objects.filter(
+            author_id__in={record['author_id'] for record in batch},
+            name__in={record['name'] for record in batch},
+            pub_date__in={record['pub_date'] for record in batch},
+        ).values_list('author_id', 'name', 'pub_date'))
+        records = []
+        for record in batch:
+            key = (record['author_id'], record['name'], record['pub_date'])
+            if key not in seen:
+                seen.add(key)
+                records.append(record)
+        return records
+
+    def check_tags(self, batch):
+        """Теги всех рецептов порции должны быть в базе."""
+        for record in batch:
+            for slug in record['tags']:
+                if slug not in self.tags:
+                    raise CommandError(
+                        f'Рецепт «{record["name"]}» автора '
+                        f'{record["author"]["email"]}: неизвестный тег '
+                        f'{slug}. Создайте тег и повторите загрузку, '
+                        f'уже загруженные рецепты будут пропущены.'
+                    )
+
+    @transaction.atomic
+    def import_batch(self, batch):
+        authors = dict(User.objects.filter(
+            email__in={record['author']['email'] for record in batch}
+        ).values_list('email', 'id'))
+        batch = self.new_records(batch, authors)
+        self.check_tags(batch)
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author_id=record['author_id'],
+                   name=record['name'], text=record['text'],
+                   cooking_time=record['cooking_time'],
+                   image=record['image'],
+                   tags_mask=Tag.mask(self.tags[slug]
+                                      for slug in record['tags']))
+            for record in batch
+        )
+        for recipe, record in zip(recipes, batch):
+            recipe.pub_date = record['pub_date']
+        Recipe.objects.bulk_update(recipes, ('pub_date',))
+
+        amounts, recipe_tags = [], []
+        for recipe, record in zip(recipes, batch):
+            for ingredient in record['ingredients']:
+                key = (ingredient['name'], ingredient['measurement_unit'])
+                if key not in self.ingredients:
+                    self.ingredients[key] = Ingredient.objects.create(
+                        name=key[0], measurement_unit=key[1]
+                    ).id
+                amounts.append(IngredientsAmount(
+                    recipe=recipe, ingredient_id=self.ingredients[key],
+                    amount=ingredient['amount']
+                ))
+            recipe_tags.extend(
+                Recipe.tags.through(recipe=recipe, tag=self.tags[slug])
+                for slug in record['tags']
+            )
+        IngredientsAmount.objects.bulk_create(amounts)
+        Recipe.tags.through.objects.bulk_create(recipe_tags)
+
+        authors_by_delta = defaultdict(list)
+        for author, delta in Counter(recipe.author_id
+                                     for recipe in recipes).items():
+            authors_by_delta[delta].append(author)
+        for delta, authors in authors_by_delta.items():
+            change_counter(User.objects.filter(pk__in=authors),
+                           'recipes_count', delta)
+        TimelineEntry.objects.fan_out(recipes)
+        return len(recipes)
@@ -1,33 +1,147 @@
 import csv
+import hashlib
+import json
 import os
+from itertools import islice
+from time import monotonic
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
-from app.models import Ingredient
+from api.cache import bump_version
+from api.search import ingredient_index
+from app.models import DataFile, Ingredient
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+BATCH_SIZE = 1000
+HASH_CHUNK_SIZE = 64 * 1024
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def file_checksum(path):
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def read_csv(f):
+    for name, measurement_unit in csv.reader(f):
+        yield name, measurement_unit
+
+
+def decode_value(decoder, buffer, eof):
+    """Значение из начала буфера и его конец или None, если данных мало."""
+    if not buffer:
+        return None
+    try:
+        value, end = decoder.raw_decode(buffer)
+    except json.JSONDecodeError:
+        return None
+    # Значение в самом конце буфера может быть обрезано, например число.
+    if end == len(buffer) and not eof:
+        return None
+    return value, end
+
+
+def iter_json_array(f):
+    """Элементы JSON-массива по одному, файл читается по частям."""
+    decoder = json.JSONDecoder()
+    buffer, eof = '', False
+    expected = '['
+    while True:
+        buffer = buffer.lstrip()
+        if buffer and expected:
+            if buffer[0] not in expected:
+                raise CommandError('Файл JSON не содержит массив')
+            if buffer[0] == ']':
+                return
+            buffer, expected = buffer[1:], ''
+            continue
+        if buffer[:1] == ']':
+            return
+        decoded = decode_value(decoder, buffer, eof)
+        if decoded is not None:
+            item, end = decoded
+            yield item
+            buffer, expected = buffer[end:], ',]'
+            continue
+        if eof:
+            raise CommandError('Файл JSON обрывается')
+        chunk = f.read(JSON_CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+def read_json(f):
+    for row in iter_json_array(f):
+        yield row['name'], row['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
 
 
 class Command(BaseCommand):
-    """Добавляем ингредиенты из файла CSV."""
+    """
+    Добавляем ингредиенты из файла CSV или JSON.
+    Файл, который уже был загружен без изменений, пропускается.
+    """
 
     def add_arguments(self, parser):
         parser.add_argument('filename', default='ingredients.csv',
                             nargs='?', type=str)
+        parser.add_argument('--force', action='store_true',
+                            help='Загрузить файл, даже если он не менялся.')
 
     def handle(self, *args, **options):
+        started = monotonic()
+        filename = options['filename']
+        reader = READERS.get(os.path.splitext(filename)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются файлы форматов CSV и JSON')
+        path = os.path.join(DATA_ROOT, filename)
         try:
-            with open(os.path.join(DATA_ROOT, options['filename']),
-                      'r', encoding='utf-8') as f:
-                data = csv.reader(f)
-                for row in data:
-                    name, measurement_unit = row
-                    Ingredient.objects.get_or_create(
-                        name=name, measurement_unit=measurement_unit
-                    )
-                self.stdout.write(
-                    self.style.SUCCESS('=== Ингредиенты успешно загружены ===')
-                )
+            checksum = file_checksum(path)
         except FileNotFoundError:
             raise CommandError('Добавьте файл ingredients в директорию data')
+
+        if (not options['force'] and DataFile.objects.filter(
+                filename=filename, checksum=checksum).exists()):
+            self.stdout.write(self.style.SUCCESS(
+                f'=== Файл {filename} не изменился, загрузка пропущена '
+                f'({monotonic() - started:.2f} с) ==='
+            ))
+            return
+
+        total = 0
+        with transaction.atomic():
+            before = Ingredient.objects.count()
+            with open(path, 'r', encoding='utf-8') as f:
+                rows = reader(f)
+                while batch := list(islice(rows, BATCH_SIZE)):
+                    Ingredient.objects.bulk_create(
+                        (Ingredient(name=name,
+                                    measurement_unit=measurement_unit)
+                         for name, measurement_unit in batch),
+                        ignore_conflicts=True
+                    )
+                    total += len(batch)
+            inserted = Ingredient.objects.count() - before
+            DataFile.objects.update_or_create(
+                filename=filename, defaults={'checksum': checksum}
+            )
+        # bulk_create не вызывает post_save, поэтому версию справочника
+        # и индекс автодополнения сбрасываем сами.
+        if inserted:
+            bump_version(Ingredient)
+            ingredient_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            '=== Ингредиенты успешно загружены: '
+            f'добавлено {inserted}, пропущено {total - inserted} '
+            f'({monotonic() - started:.2f} с) ==='
+        ))
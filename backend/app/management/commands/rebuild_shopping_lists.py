@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.models import ShoppingListItem
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    """Пересобираем или сверяем итоговые списки покупок."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Только сверить таблицу, не пересобирая.')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+        else:
+            self.rebuild()
+
+    def rebuild(self):
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                (ShoppingListItem(user_id=row['user'],
+                                  ingredient_id=row['ingredient'],
+                                  total_amount=row['total_amount'])
+                 for row in ShoppingListItem.objects.totals().iterator()),
+                batch_size=BATCH_SIZE
+            )
+        self.stdout.write(self.style.SUCCESS(
+            '=== Списки покупок пересобраны: '
+            f'{ShoppingListItem.objects.count()} строк ==='
+        ))
+
+    def verify(self):
+        expected = {
+            (row['user'], row['ingredient']): row['total_amount']
+            for row in ShoppingListItem.objects.totals().iterator()
+        }
+        actual = {
+            (user, ingredient): total_amount
+            for user, ingredient, total_amount
+            in ShoppingListItem.objects.values_list(
+                'user', 'ingredient', 'total_amount'
+            ).iterator()
+        }
+        mismatched = {
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        }
+        if mismatched:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatched)}. '
+                'Запустите команду без --verify.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Списки покупок актуальны: {len(actual)} строк ==='
+        ))
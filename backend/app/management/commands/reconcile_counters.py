@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from app.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow
+
+User = get_user_model()
+
+# Модель, поле счетчика, считаемая модель, ее поле со ссылкой на объект.
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopcarts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def actual_count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    """Сверяем счетчики избранного, покупок, рецептов и подписчиков."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Только сверить счетчики, не исправляя.')
+
+    def handle(self, *args, **options):
+        drift = 0
+        for model, counter, related, field in COUNTERS:
+            actual = actual_count(related, field)
+            mismatched = list(model.objects.annotate(actual=actual).exclude(
+                **{counter: F('actual')}
+            ).values_list('pk', flat=True))
+            if not mismatched:
+                continue
+            drift += len(mismatched)
+            self.stdout.write(f'{model._meta.label}.{counter}: '
+                              f'расхождений {len(mismatched)}')
+            if not options['verify']:
+                model.objects.filter(pk__in=mismatched).update(
+                    **{counter: actual}
+                )
+        if drift and options['verify']:
+            raise CommandError(f'Расхождений в счетчиках: {drift}. '
+                               'Запустите команду без --verify.')
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Счетчики сверены, исправлено: {drift} ==='
+        ))
@@ -0,0 +1,26 @@
+from datetime import timedelta
+from time import monotonic
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.models import TrendingScore
+
+
+class Command(BaseCommand):
+    """
+    Пересчитываем популярность рецептов для подборки trending.
+    Учитываются только записи избранного и списков покупок,
+    добавленные с прошлого запуска. Запускать по расписанию.
+    """
+
+    def handle(self, *args, **options):
+        started = monotonic()
+        events = TrendingScore.objects.refresh(
+            timedelta(hours=settings.TRENDING_HALF_LIFE)
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Популярность пересчитана: новых событий {events}, '
+            f'рецептов {TrendingScore.objects.count()} '
+            f'({monotonic() - started:.2f} с) ==='
+        ))
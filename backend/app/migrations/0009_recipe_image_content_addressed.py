@@ -0,0 +1,19 @@
+# Generated by Django 4.1.5 on 2026-10-18 18:11
+
+import app.storages
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(default='static/images/DefaultCardImg.png', storage=app.storages.ContentAddressedStorage(), upload_to='recipe_images', verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.1.5 on 2026-10-18 18:16
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count(model, field):
+    return Coalesce(models.Subquery(
+        model.objects.filter(**{field: models.OuterRef('pk')}).order_by()
+        .values(field).annotate(total=models.Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('app', 'Recipe')
+    Favorite = apps.get_model('app', 'Favorite')
+    ShoppingCart = apps.get_model('app', 'ShoppingCart')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Recipe.objects.update(favorites_count=count(Favorite, 'recipe'),
+                          shopcarts_count=count(ShoppingCart, 'recipe'))
+    User.objects.update(recipes_count=count(Recipe, 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_recipe_image_content_addressed'),
+        ('users', '0002_customuser_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopcarts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списке покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.1.5 on 2026-10-18 18:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('refreshed_at', models.DateTimeField(null=True, verbose_name='Дата пересчета')),
+                ('anchor', models.DateTimeField(null=True, verbose_name='Точка отсчета баллов')),
+            ],
+            options={
+                'verbose_name': 'Отметка пересчета популярности',
+                'verbose_name_plural': 'Отметки пересчета популярности',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='app.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(default=0, verbose_name='Популярность')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='trending_counted',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Учтено в популярности'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='trending_counted',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Учтено в популярности'),
+        ),
+        migrations.AddIndex(
+            model_name='trendingscore',
+            index=models.Index(fields=['-score'], name='trending_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(condition=models.Q(('trending_counted', False)), fields=['recipe'], name='favorite_trending_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(condition=models.Q(('trending_counted', False)), fields=['recipe'], name='cart_trending_new_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.1.5 on 2026-10-18 21:40
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+TAG_MASK_BITS = 63
+
+
+def fill_tag_masks(apps, schema_editor):
+    Tag = apps.get_model('app', 'Tag')
+    Recipe = apps.get_model('app', 'Recipe')
+    tags = list(Tag.objects.order_by('id'))
+    if len(tags) > TAG_MASK_BITS:
+        raise ValueError(f'Тегов не может быть больше {TAG_MASK_BITS}.')
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ('bit',))
+    masks = defaultdict(int)
+    for recipe_id, bit in Recipe.tags.through.objects.values_list(
+            'recipe_id', 'tag__bit'):
+        masks[recipe_id] |= 1 << bit
+    recipes_by_mask = defaultdict(list)
+    for recipe_id, mask in masks.items():
+        recipes_by_mask[mask].append(recipe_id)
+    for mask, recipes in recipes_by_mask.items():
+        Recipe.objects.filter(pk__in=recipes).update(tags_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='Бит в маске рецепта'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tag_masks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, unique=True, verbose_name='Бит в маске рецепта'),
+        ),
+    ]
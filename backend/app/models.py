@@ -1,10 +1,33 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.core.validators import MinLengthValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch, Sum,
+                              Value)
+from django.utils import timezone
+
+from users.models import Follow
+
+from .storages import ContentAddressedStorage
 
 User = get_user_model()
 
 RECIPE_NAME_PREVIEW = 20
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
+TAG_MASK_BITS = 63
+
+
+def change_counter(queryset, field, delta):
+    """
+    Атомарно меняет счетчик на delta одним UPDATE через F().
+    Счетчик не уходит ниже нуля, расхождения чинит reconcile_counters.
+    """
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
 
 
 class Ingredient(models.Model):
@@ -30,6 +53,23 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
+class DataFile(models.Model):
+    """
+    Отпечаток загруженного файла с данными.
+    Позволяет не загружать повторно файл, который не менялся.
+    """
+    filename = models.CharField('Файл', max_length=255, unique=True)
+    checksum = models.CharField('Контрольная сумма', max_length=64)
+    loaded_at = models.DateTimeField('Дата загрузки', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Загруженный файл'
+        verbose_name_plural = 'Загруженные файлы'
+
+    def __str__(self):
+        return self.filename
+
+
 class Tag(models.Model):
     """
     Модель тега.
@@ -51,6 +91,8 @@ class Tag(models.Model):
         ]
     )
     slug = models.SlugField('Слаг', max_length=100, unique=True)
+    bit = models.PositiveSmallIntegerField('Бит в маске рецепта',
+                                           unique=True, editable=False)
 
     class Meta:
         verbose_name = 'Тег'
@@ -61,10 +103,84 @@ class Tag(models.Model):
                                     name='unique_tag')
         ]
 
+    @staticmethod
+    def free_bit():
+        """Младший свободный бит маски или None, если заняты все."""
+        used = set(Tag.objects.values_list('bit', flat=True))
+        return next((bit for bit in range(TAG_MASK_BITS) if bit not in used),
+                    None)
+
+    @staticmethod
+    def mask(tags):
+        """Маска рецепта с тегами tags."""
+        mask = 0
+        for tag in tags:
+            mask |= 1 << tag.bit
+        return mask
+
+    def clean(self):
+        if self.bit is None and self.free_bit() is None:
+            raise ValidationError(
+                f'Тегов не может быть больше {TAG_MASK_BITS}.'
+            )
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = self.free_bit()
+            if self.bit is None:
+                raise ValidationError(
+                    f'Тегов не может быть больше {TAG_MASK_BITS}.'
+                )
+        return super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """
+    Набор запросов рецептов.
+    Подгружает связанные данные и флаги пользователя одним запросом,
+    чтобы сериализатор списка не обращался к базе для каждого рецепта.
+    """
+
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch('amounts', queryset=IngredientsAmount.objects
+                     .select_related('ingredient'))
+        )
+
+    def with_tags(self, mask, match_all=False):
+        """
+        Рецепты с любым или со всеми тегами из маски mask.
+        Проверяется побитовым И, поэтому условие не зависит от того,
+        какие биты тегов известны процессу.
+        """
+        queryset = self.alias(matched_tags=F('tags_mask').bitand(mask))
+        if match_all:
+            return queryset.filter(matched_tags=mask)
+        return queryset.filter(matched_tags__gt=0)
+
+    def with_user_flags(self, user):
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(is_favorited=false,
+                                 is_in_shopping_cart=false,
+                                 author_is_subscribed=false)
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            ))
+        )
+
+
 class Recipe(models.Model):
     """
     Модель рецепта.
@@ -86,7 +202,8 @@ class Recipe(models.Model):
         Tag, related_name='recipes', verbose_name='Теги'
     )
     image = models.ImageField('Изображение',
-                              upload_to='recipe_images/%Y/%m/%d',
+                              upload_to='recipe_images',
+                              storage=ContentAddressedStorage(),
                               default='static/images/DefaultCardImg.png')
     text = models.TextField('Описание', max_length=1000)
     cooking_time = models.PositiveSmallIntegerField(
@@ -102,11 +219,41 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         'Дата публикации', auto_now_add=True, db_index=True
     )
+    favorites_count = models.PositiveIntegerField('В избранном', default=0,
+                                                  editable=False)
+    shopcarts_count = models.PositiveIntegerField('В списке покупок',
+                                                  default=0, editable=False)
+    tags_mask = models.BigIntegerField('Маска тегов', default=0,
+                                       editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    COUNTERS = ('favorites_count', 'shopcarts_count')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=list(POPULAR_ORDERING),
+                         name='recipe_popular_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Счетчики меняются только через change_counter,
+        при сохранении рецепта они не перезаписываются.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTERS
+            ]
+        return super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name[:RECIPE_NAME_PREVIEW]
@@ -164,6 +311,8 @@ class Favorite(models.Model):
                                on_delete=models.CASCADE,
                                related_name='favorites',
                                verbose_name='Рецепт')
+    trending_counted = models.BooleanField('Учтено в популярности',
+                                           default=False, editable=False)
 
     class Meta:
         verbose_name = 'Список избранного'
@@ -172,6 +321,10 @@ class Favorite(models.Model):
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique_favorite_recipe')
         ]
+        indexes = [
+            models.Index(fields=['recipe'], name='favorite_trending_new_idx',
+                         condition=models.Q(trending_counted=False))
+        ]
 
     def __str__(self):
         return f'{self.recipe} в избранном у {self.user}'
@@ -190,6 +343,8 @@ class ShoppingCart(models.Model):
                                on_delete=models.CASCADE,
                                verbose_name='Рецепты',
                                related_name='shopcarts')
+    trending_counted = models.BooleanField('Учтено в популярности',
+                                           default=False, editable=False)
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -198,6 +353,294 @@ class ShoppingCart(models.Model):
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique_shopping_cart_recipe')
         ]
+        indexes = [
+            models.Index(fields=['recipe'], name='cart_trending_new_idx',
+                         condition=models.Q(trending_counted=False))
+        ]
 
     def __str__(self):
         return f'{self.recipe} в списке покупок у {self.user}'
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    """
+    Набор запросов итогового списка покупок.
+    Пересчитывает только затронутые пары пользователь/ингредиент.
+    """
+
+    def totals(self, users=None, ingredients=None):
+        """Суммы ингредиентов по рецептам из списков покупок."""
+        queryset = IngredientsAmount.objects.all()
+        if users is not None:
+            queryset = queryset.filter(recipe__shopcarts__user__in=users)
+        else:
+            queryset = queryset.filter(recipe__shopcarts__isnull=False)
+        if ingredients is not None:
+            queryset = queryset.filter(ingredient__in=ingredients)
+        return queryset.values(
+            'ingredient', user=F('recipe__shopcarts__user')
+        ).annotate(total_amount=Sum('amount')).order_by()
+
+    def refresh(self, users, ingredients):
+        """
+        Пересчитывает суммы ингредиентов ingredients у пользователей users.
+        Строки пользователей блокируются до конца транзакции: параллельный
+        пересчет того же списка ждет и читает суммы уже после фиксации,
+        а не перезаписывает их своими устаревшими.
+        """
+        users, ingredients = list(users), list(ingredients)
+        if not users or not ingredients:
+            return
+        scope = self.filter(user__in=users, ingredient__in=ingredients)
+        with transaction.atomic():
+            list(User.objects.select_for_update().filter(
+                pk__in=users
+            ).order_by('pk').values_list('pk', flat=True))
+            items = [
+                self.model(user_id=row['user'],
+                           ingredient_id=row['ingredient'],
+                           total_amount=row['total_amount'])
+                for row in self.totals(users, ingredients)
+            ]
+            scope.update(total_amount=0)
+            self.bulk_create(items, update_conflicts=True,
+                             unique_fields=('user', 'ingredient'),
+                             update_fields=('total_amount',))
+            scope.filter(total_amount=0).delete()
+
+    def refresh_recipe(self, recipe, users=None, ingredients=None):
+        """
+        Пересчитывает ингредиенты рецепта у пользователей,
+        в чьих списках покупок он лежит.
+        """
+        if users is None:
+            users = recipe.shopcarts.values_list('user', flat=True)
+        if ingredients is None:
+            ingredients = recipe.amounts.values_list('ingredient', flat=True)
+        self.refresh(users, ingredients)
+
+
+class ShoppingListItem(models.Model):
+    """
+    Итоговое кол-во ингредиента в списке покупок пользователя.
+    Обновляется при изменении списка покупок и рецептов в нем.
+    Уникальные поля: user, ingredient
+    """
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             verbose_name='Пользователь',
+                             related_name='shopping_list')
+    ingredient = models.ForeignKey(Ingredient,
+                                   on_delete=models.CASCADE,
+                                   verbose_name='Ингредиент',
+                                   related_name='shopping_list_items')
+    total_amount = models.PositiveIntegerField('Общее количество')
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списка покупок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return (f'{self.ingredient} - {self.total_amount} '
+                f'в списке покупок у {self.user}')
+
+
+class TrendingCheckpoint(models.Model):
+    """
+    Отметка пересчета популярности.
+    Баллы в TrendingScore хранятся приведенными к моменту anchor.
+    """
+    anchor = models.DateTimeField('Точка отсчета баллов', null=True)
+    refreshed_at = models.DateTimeField('Дата пересчета', null=True)
+
+    class Meta:
+        verbose_name = 'Отметка пересчета популярности'
+        verbose_name_plural = 'Отметки пересчета популярности'
+
+    def __str__(self):
+        return f'Пересчет популярности {self.refreshed_at}'
+
+
+class TrendingScoreQuerySet(models.QuerySet):
+    """
+    Набор запросов популярности рецептов.
+    Каждое добавление в избранное или список покупок дает рецепту вес,
+    который экспоненциально затухает со временем.
+    Затухание общее для всех рецептов, поэтому хранится не сам балл,
+    а балл, приведенный к моменту anchor: вес события, учтенного в now,
+    умножается на 2 ** ((now - anchor) / half_life). Порядок рецептов
+    от этого не меняется, и пересчет не переписывает всю таблицу.
+    """
+    weights = (
+        (Favorite, 1.0),
+        (ShoppingCart, 2.0),
+    )
+    min_score = 0.01
+    # Когда множитель доходит до 2 ** rebase_exponent, баллы приводятся
+    # к новой точке отсчета, чтобы не терять точность.
+    rebase_exponent = 64
+    batch_size = 1000
+
+    def refresh(self, half_life, now=None):
+        """
+        Добавляет события, еще не учтенные в популярности, и удаляет
+        затухшие баллы. Каждое событие учитывается ровно один раз, даже
+        если его транзакция завершилась позже следующего пересчета.
+        Возвращает кол-во событий.
+        """
+        now = now or timezone.now()
+        with transaction.atomic():
+            TrendingCheckpoint.objects.get_or_create(pk=1)
+            checkpoint = TrendingCheckpoint.objects.select_for_update().get(
+                pk=1
+            )
+            if checkpoint.anchor is None:
+                checkpoint.anchor = now
+            exponent = ((now - checkpoint.anchor).total_seconds()
+                        / half_life.total_seconds())
+            if exponent > self.rebase_exponent:
+                self.update(score=F('score') * 0.5 ** exponent)
+                checkpoint.anchor, exponent = now, 0
+            growth = 2 ** exponent
+            self.filter(score__lt=self.min_score * growth).delete()
+
+            deltas, events = defaultdict(float), 0
+            for model, weight in self.weights:
+                rows = list(model.objects.filter(
+                    trending_counted=False
+                ).values_list('pk', 'recipe'))
+                for _, recipe in rows:
+                    deltas[recipe] += weight * growth
+                for start in range(0, len(rows), self.batch_size):
+                    model.objects.filter(pk__in=[
+                        pk for pk, _ in rows[start:start + self.batch_size]
+                    ]).update(trending_counted=True)
+                events += len(rows)
+            scores = dict(self.filter(recipe__in=deltas).values_list(
+                'recipe', 'score'
+            ))
+            self.bulk_create(
+                (self.model(recipe_id=recipe,
+                            score=scores.get(recipe, 0) + delta)
+                 for recipe, delta in deltas.items()),
+                update_conflicts=True, unique_fields=('recipe',),
+                update_fields=('score',)
+            )
+            checkpoint.refreshed_at = now
+            checkpoint.save()
+        return events
+
+
+class TrendingScore(models.Model):
+    """
+    Популярность рецепта за последнее время.
+    Заполняется командой refresh_trending, балл приведен к моменту
+    TrendingCheckpoint.anchor.
+    """
+    recipe = models.OneToOneField(Recipe,
+                                  on_delete=models.CASCADE,
+                                  primary_key=True,
+                                  related_name='trending',
+                                  verbose_name='Рецепт')
+    score = models.FloatField('Популярность', default=0)
+
+    objects = TrendingScoreQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(fields=['-score'], name='trending_score_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.recipe}: {self.score:.2f}'
+
+
+class TimelineQuerySet(models.QuerySet):
+    """
+    Набор запросов ленты подписок.
+    Новые рецепты раскладываются по лентам подписчиков при публикации.
+    Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+    не раскладываются, лента добирает их при чтении.
+    """
+    batch_size = 1000
+
+    def fan_out(self, recipes):
+        by_author = defaultdict(list)
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe)
+        followers = Follow.objects.filter(
+            author__in=by_author,
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT
+        ).values_list('author', 'user')
+        self.bulk_create(
+            (self.model(user_id=user, recipe=recipe, author_id=author,
+                        pub_date=recipe.pub_date)
+             for author, user in followers.iterator()
+             for recipe in by_author[author]),
+            batch_size=self.batch_size, ignore_conflicts=True
+        )
+
+    def backfill(self, user, author):
+        """Добавляет в ленту последние рецепты нового автора."""
+        if author.followers_count > settings.FEED_FANOUT_LIMIT:
+            return
+        recipes = author.recipes.order_by('-pub_date', '-id').values_list(
+            'pk', 'pub_date'
+        )[:settings.FEED_BACKFILL_SIZE]
+        self.bulk_create(
+            (self.model(user=user, recipe_id=recipe, author=author,
+                        pub_date=pub_date)
+             for recipe, pub_date in recipes),
+            ignore_conflicts=True
+        )
+
+    def prune(self, user, author):
+        return self.filter(user=user, author=author).delete()
+
+
+class TimelineEntry(models.Model):
+    """
+    Рецепт в ленте подписчика.
+    Дата публикации копируется из рецепта, чтобы страница ленты
+    читалась одним проходом по индексу (user, -pub_date, -recipe).
+    """
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Подписчик')
+    recipe = models.ForeignKey(Recipe,
+                               on_delete=models.CASCADE,
+                               related_name='timeline_entries',
+                               verbose_name='Рецепт')
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+',
+                               verbose_name='Автор')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    objects = TimelineQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте у {self.user}'
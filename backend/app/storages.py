@@ -0,0 +1,31 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - хэш его содержимого.
+    Одинаковые картинки сохраняются на диск один раз и разделяются
+    всеми ссылающимися на них записями.
+    """
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            return super().save(name, content, max_length)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        name = posixpath.join(
+            posixpath.dirname(name), digest[:2],
+            digest + os.path.splitext(name)[1].lower()
+        )
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
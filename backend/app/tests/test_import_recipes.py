@@ -0,0 +1,69 @@
+import io
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from api.tests.utils import (create_ingredient, create_recipe, create_tag,
+                             create_user)
+from app.models import IngredientsAmount, Recipe, Tag
+
+User = get_user_model()
+
+
+class ImportRecipesTests(TestCase):
+    """Повторная загрузка того же файла не создает дубликатов."""
+
+    def setUp(self):
+        self.author = create_user('author')
+        tag = create_tag('lunch')
+        flour = create_ingredient('мука')
+        for name in ('Блины', 'Оладьи', 'Блины'):
+            create_recipe(self.author, name, [tag], [flour])
+        fd, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        call_command('export_recipes', self.path, stderr=io.StringIO())
+        self.exported = sorted(
+            Recipe.objects.values_list('name', 'pub_date', 'tags__slug')
+        )
+
+    def load(self, batch_size=2):
+        call_command('import_recipes', self.path, batch_size=batch_size,
+                     stdout=io.StringIO())
+
+    def test_import_into_existing_is_noop(self):
+        self.load()
+        self.assertEqual(Recipe.objects.count(), 3)
+
+    def test_reimport_is_idempotent(self):
+        Recipe.objects.all().delete()
+        User.objects.filter(pk=self.author.pk).update(recipes_count=0)
+        self.load()
+        self.load(batch_size=10)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('name', 'pub_date',
+                                              'tags__slug')),
+            self.exported
+        )
+        self.assertEqual(IngredientsAmount.objects.count(), 3)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 3)
+
+    def test_duplicate_lines_in_file(self):
+        with open(self.path, encoding='utf-8') as f:
+            lines = f.readlines()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(lines + lines)
+        Recipe.objects.all().delete()
+        self.load(batch_size=4)
+        self.assertEqual(Recipe.objects.count(), 3)
+
+    def test_unknown_tag_stops_import(self):
+        Recipe.objects.all().delete()
+        Tag.objects.filter(slug='lunch').delete()
+        with self.assertRaisesMessage(CommandError, 'неизвестный тег lunch'):
+            self.load(batch_size=10)
+        self.assertEqual(Recipe.objects.count(), 0)
@@ -0,0 +1,75 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from api.cache import get_version
+from api.search import ingredient_index
+from app.management.commands import load_ingredients
+from app.models import Ingredient
+
+ROWS = [{'name': f'ингредиент {i}', 'measurement_unit': 'г'}
+        for i in range(50)]
+
+
+class IterJsonArrayTests(TestCase):
+    """Потоковое чтение JSON совпадает с json.load при любом размере части."""
+
+    def read(self, text, chunk_size):
+        with mock.patch.object(load_ingredients, 'JSON_CHUNK_SIZE',
+                               chunk_size):
+            return list(load_ingredients.iter_json_array(io.StringIO(text)))
+
+    def test_chunk_boundaries(self):
+        text = json.dumps([*ROWS, 12345, 'строка, с ]', [1, 2]], indent=1)
+        for chunk_size in (1, 3, 64, 1 << 16):
+            self.assertEqual(self.read(text, chunk_size), json.loads(text))
+
+    def test_empty_array(self):
+        self.assertEqual(self.read(' [ ] ', 1), [])
+
+    def test_broken_file(self):
+        for text in ('', '{}', '[1,', '[1 2]'):
+            with self.assertRaises(CommandError):
+                self.read(text, 2)
+
+
+class LoadIngredientsTests(TestCase):
+    """Загрузка сбрасывает общую версию и индекс автодополнения."""
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(ROWS, f, ensure_ascii=False)
+        self.addCleanup(os.remove, self.path)
+
+    def load(self):
+        call_command('load_ingredients', self.path, stdout=io.StringIO())
+
+    def test_load_resets_index_and_version(self):
+        self.assertEqual(ingredient_index.search('ингредиент'), [])
+        version = get_version(Ingredient)
+        self.load()
+        self.assertNotEqual(get_version(Ingredient), version)
+        self.assertEqual(len(ingredient_index.search('ингредиент')), 50)
+
+    def test_index_follows_version_bumped_elsewhere(self):
+        ingredient_index.search('ингредиент')
+        with mock.patch.object(ingredient_index, 'invalidate'):
+            self.load()
+        self.assertEqual(len(ingredient_index.search('ингредиент')), 50)
+
+    def test_reload_is_skipped(self):
+        self.load()
+        version = get_version(Ingredient)
+        self.load()
+        self.assertEqual(Ingredient.objects.count(), 50)
+        self.assertEqual(get_version(Ingredient), version)
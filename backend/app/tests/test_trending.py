@@ -0,0 +1,89 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.tests.utils import create_recipe, create_user
+from app.models import (Favorite, ShoppingCart, TrendingScore,
+                        TrendingScoreQuerySet)
+
+HALF_LIFE = timedelta(hours=72)
+
+
+class TrendingRefreshTests(TestCase):
+    """Пересчет популярности учитывает каждое событие один раз."""
+
+    def setUp(self):
+        self.now = timezone.now()
+        author = create_user('author')
+        self.first = create_recipe(author, 'Первый')
+        self.second = create_recipe(author, 'Второй')
+        self.users = [create_user(f'user{i}') for i in range(3)]
+
+    def refresh(self, half_lives=0):
+        return TrendingScore.objects.refresh(
+            HALF_LIFE, now=self.now + HALF_LIFE * half_lives
+        )
+
+    def scores(self):
+        return dict(TrendingScore.objects.values_list('recipe', 'score'))
+
+    def test_events_counted_once(self):
+        Favorite.objects.create(user=self.users[0], recipe=self.first)
+        ShoppingCart.objects.create(user=self.users[0], recipe=self.first)
+        self.assertEqual(self.refresh(), 2)
+        self.assertEqual(self.refresh(), 0)
+        self.assertEqual(self.scores(), {self.first.id: 3.0})
+
+    def test_late_commit_is_not_skipped(self):
+        late = Favorite.objects.create(user=self.users[0], recipe=self.first)
+        late.delete()
+        Favorite.objects.create(user=self.users[1], recipe=self.first)
+        self.refresh()
+        # Событие с меньшим id появилось после пересчета,
+        # как будто его транзакция завершилась позже.
+        Favorite.objects.create(pk=late.pk, user=self.users[0],
+                                recipe=self.second)
+        self.assertEqual(self.refresh(), 1)
+        self.assertEqual(self.scores(),
+                         {self.first.id: 1.0, self.second.id: 1.0})
+
+    def test_decay_does_not_rewrite_table(self):
+        Favorite.objects.create(user=self.users[0], recipe=self.first)
+        self.refresh()
+        with CaptureQueriesContext(connection) as context:
+            self.refresh(1)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "app_trendingscore"')
+        ])
+        Favorite.objects.create(user=self.users[1], recipe=self.second)
+        self.refresh(1)
+        # Через период полураспада первое событие весит вдвое меньше.
+        self.assertEqual(self.scores(),
+                         {self.first.id: 1.0, self.second.id: 2.0})
+        ordered = TrendingScore.objects.order_by('-score')
+        self.assertEqual(ordered.first().recipe_id, self.second.id)
+
+    def test_faded_scores_are_removed(self):
+        Favorite.objects.create(user=self.users[0], recipe=self.first)
+        self.refresh()
+        self.refresh(6)
+        self.assertEqual(len(self.scores()), 1)
+        self.refresh(7)
+        self.assertEqual(self.scores(), {})
+
+    def test_rebase_keeps_relative_scores(self):
+        Favorite.objects.create(user=self.users[0], recipe=self.first)
+        self.refresh()
+        Favorite.objects.create(user=self.users[1], recipe=self.second)
+        ShoppingCart.objects.create(user=self.users[1], recipe=self.second)
+        self.refresh(3)
+        with mock.patch.object(TrendingScoreQuerySet, 'rebase_exponent', 4):
+            self.refresh(5)
+        scores = self.scores()
+        self.assertAlmostEqual(scores[self.first.id], 2 ** -5)
+        self.assertAlmostEqual(scores[self.second.id], 3 * 2 ** -2)
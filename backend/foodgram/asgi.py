@@ -0,0 +1,14 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+# Под ASGI каждый запрос выполняется в своем потоке, а соединения с базой
+# привязаны к потоку: постоянные соединения здесь не переиспользуются
+# и остались бы открытыми. Пул соединений держит PgBouncer (docker-compose).
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+# Потоковый ответ Django 4.1 читает в цикле событий, где запросы к базе
+# запрещены, поэтому список покупок собирается целиком в потоке запроса.
+os.environ.setdefault('SHOPPING_LIST_STREAMING', 'False')
+
+application = get_asgi_application()
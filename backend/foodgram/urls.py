@@ -3,9 +3,15 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from api.metrics import metrics
+from api.thumbnails import THUMBNAILS_DIR, thumbnail
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include('api.urls'))
+    path('api/', include('api.urls')),
+    path('metrics', metrics, name='metrics'),
+    path(f'{settings.MEDIA_URL.strip("/")}/{THUMBNAILS_DIR}/'
+         '<str:rendition>/<path:name>', thumbnail, name='thumbnail'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
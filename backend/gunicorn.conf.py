@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+import shutil
+
+# Запуск под ASGI: gunicorn -c gunicorn.conf.py foodgram.asgi
+# Запуск под WSGI: GUNICORN_WORKER_CLASS=sync gunicorn -c gunicorn.conf.py
+# foodgram.wsgi
+# Версии кэша, снимки токенов, индексы в памяти и закрепление за основной
+# базой согласуются между воркерами через общий кэш. С кэшем в памяти
+# процесса (LocMemCache) воркер может быть только один.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+shared_cache = os.getenv('CACHE_BACKEND',
+                         LOCAL_CACHE_BACKENDS[0]) not in LOCAL_CACHE_BACKENDS
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', multiprocessing.cpu_count() + 1 if shared_cache else 1
+))
+if workers > 1 and not shared_cache:
+    raise RuntimeError(
+        'Для GUNICORN_WORKERS > 1 нужен общий кэш: задайте CACHE_BACKEND '
+        '(например django.core.cache.backends.redis.RedisCache) '
+        'и CACHE_LOCATION'
+    )
+worker_class = os.getenv('GUNICORN_WORKER_CLASS',
+                         'uvicorn.workers.UvicornWorker')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+
+def on_starting(server):
+    """Очищает метрики воркеров прошлого запуска."""
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    """Метрики завершившегося воркера больше не суммируются в gauge."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
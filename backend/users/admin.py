@@ -7,7 +7,8 @@ from .models import CustomUser, Follow
 
 class CustomUserAdmin(UserAdmin):
     """Кастомное отображение модели User а админке."""
-    list_display = ('username', 'first_name', 'last_name', 'email')
+    list_display = ('username', 'first_name', 'last_name', 'email',
+                    'recipes_count')
     list_filter = ('email', 'first_name')
     search_fields = ('username', 'email')
     empty_value_display = '--пусто--'
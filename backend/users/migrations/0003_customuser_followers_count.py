@@ -0,0 +1,30 @@
+# Generated by Django 4.1.5 on 2026-10-18 18:20
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Follow = apps.get_model('users', 'Follow')
+    CustomUser.objects.update(followers_count=Coalesce(models.Subquery(
+        Follow.objects.filter(author=models.OuterRef('pk')).order_by()
+        .values('author').annotate(total=models.Count('pk')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuser_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.RunPython(fill_followers_count,
+                             migrations.RunPython.noop),
+    ]
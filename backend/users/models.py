@@ -1,6 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db.models import (CASCADE, CharField, EmailField, ForeignKey,
-                              Model, UniqueConstraint)
+                              Model, PositiveIntegerField, UniqueConstraint)
 from rest_framework.exceptions import ValidationError
 
 
@@ -17,9 +17,14 @@ class CustomUser(AbstractUser):
     email = EmailField('Email',
                        unique=True,
                        max_length=200)
+    recipes_count = PositiveIntegerField('Рецептов', default=0,
+                                         editable=False)
+    followers_count = PositiveIntegerField('Подписчиков', default=0,
+                                           editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
+    COUNTERS = ('recipes_count', 'followers_count')
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -37,6 +42,11 @@ class CustomUser(AbstractUser):
 
     def save(self, *args, **kwargs):
         self.full_clean()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTERS
+            ]
         return super().save(*args, **kwargs)
 
     def __str__(self):